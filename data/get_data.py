@@ -1,158 +1,425 @@
 import requests
-import pandas as pd
+import csv
+import json
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 # ==============================
 # Configuration
 # ==============================
 OUTPUT_CSV = "arabic_personalities_full.csv"
+CHECKPOINT_DIR = "arabic_personalities_full.checkpoint"
+# the single-file checkpoint of the previous crawler, imported once into CHECKPOINT_DIR
+LEGACY_JSONL = "arabic_personalities_full.jsonl"
+LEGACY_STATE = "arabic_personalities_full.state.json"
+IMPORTED = "imported"
+FIELDS = ["wikidata_id", "name", "gender", "country", "occupation", "birth_date", "death_date", "image_url", "description"]
 LIMIT = 1000        # Results per query
 MAX_RESULTS = 50000
 SAVE_INTERVAL = 5000
 SLEEP_BETWEEN_BATCHES = 3
 
+SPARQL_URL = "https://query.wikidata.org/sparql"
+WIKIPEDIA_SUMMARY_URL = "https://en.wikipedia.org/api/rest_v1/page/summary/{}"
+HEADERS = {"User-Agent": "AkinatorDataCollector/1.0 (Yousef)"}
+DESCRIPTION_WORKERS = 8
+DESCRIPTION_RETRIES = 5
+REQUESTS_PER_SECOND = 20
+PARTITION_WORKERS = 4
+
+# Countries of citizenship (P27) crawled, one keyset-paged partition each
+COUNTRIES = [
+    "Q79", "Q851", "Q916", "Q958", "Q843", "Q878", "Q810", "Q817",
+    "Q921", "Q1016", "Q1011", "Q846", "Q805", "Q813", "Q796", "Q800",
+    "Q1028", "Q928", "Q1037", "Q117", "Q912", "Q794",
+]
+
 # ==============================
-# Load previous progress
+# Helper: shared HTTP session and rate limiter
 # ==============================
-if os.path.exists(OUTPUT_CSV):
-    print(f"📂 Found existing file: {OUTPUT_CSV}, resuming progress...")
-    df_existing = pd.read_csv(OUTPUT_CSV)
-    all_people = df_existing.to_dict(orient="records")
-    offset = len(all_people)
-    print(f"Resuming from offset {offset} records.")
-else:
-    all_people = []
-    offset = 0
+def make_session(pool_size=DESCRIPTION_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+class RateLimiter:
+    """Spaces requests from all threads and pauses every thread after a 429."""
+    def __init__(self, per_second=REQUESTS_PER_SECOND):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+def _retry_after(response, default):
+    try:
+        return max(float(response.headers.get("Retry-After", default)), 0.0)
+    except ValueError:
+        return default
 
 # ==============================
 # Helper: Fetch Wikipedia Description
 # ==============================
-def get_wikipedia_description(name):
+def get_wikipedia_description(name, session=None, limiter=None):
     """Fetches English description from Wikipedia API."""
-    try:
-        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{name.replace(' ', '_')}"
-        headers = {"User-Agent": "AkinatorDataCollector/1.0 (Yousef)"}
-        response = requests.get(url, headers=headers, timeout=20)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("extract", "")
-        else:
+    session = session or make_session(1)
+    url = WIKIPEDIA_SUMMARY_URL.format(name.replace(' ', '_'))
+    delay = 1.0
+    for attempt in range(DESCRIPTION_RETRIES):
+        if limiter:
+            limiter.wait()
+        try:
+            response = session.get(url, timeout=20)
+        except Exception:
             return ""
-    except Exception:
+        if response.status_code == 429:
+            wait = _retry_after(response, delay)
+            if limiter:
+                limiter.backoff(wait)
+            else:
+                time.sleep(wait)
+            delay = min(delay * 2, 60)
+            continue
+        if response.status_code == 200:
+            try:
+                return response.json().get("extract", "")
+            except ValueError:
+                return ""
         return ""
+    return ""
+
+def fetch_descriptions(names, session=None, limiter=None, workers=DESCRIPTION_WORKERS, cache=None):
+    """Descriptions for each distinct name, fetched concurrently over one pooled session.
+
+    Names already in cache (shared between partitions) are not fetched again."""
+    cache = {} if cache is None else cache
+    unique = list(dict.fromkeys(n for n in names if n))
+    missing = [n for n in unique if n not in cache]
+    if missing:
+        session = session or make_session(workers)
+        limiter = limiter or RateLimiter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda n: get_wikipedia_description(n, session, limiter), missing)
+            cache.update(zip(missing, results))
+    return {n: cache[n] for n in unique}
 
 # ==============================
-# Helper: Fetch batch from Wikidata
+# Helper: Fetch pages from Wikidata (one partition per country, keyset paging)
 # ==============================
-def fetch_batch(offset):
-    query = f"""
+# Pages are ordered by the person IRI and continue after the last person seen
+# instead of using OFFSET, so deep pages cost the same as the first one and
+# rows cannot shift between pages.  A full page may end in the middle of a
+# person's rows (one per occupation); that person is left for the next page.
+def build_query(country, after=None):
+    keyset = f'FILTER(STR(?person) > "{after}")' if after else ""
+    return f"""
     SELECT ?person ?personLabel ?genderLabel ?countryLabel ?occupationLabel
            ?birthDate ?deathDate ?image
     WHERE {{
       ?person wdt:P31 wd:Q5.
       ?person wdt:P27 ?country.
-      VALUES ?country {{
-        wd:Q79 wd:Q851 wd:Q916 wd:Q958 wd:Q843 wd:Q878 wd:Q810 wd:Q817
-        wd:Q921 wd:Q1016 wd:Q1011 wd:Q846 wd:Q805 wd:Q813 wd:Q796 wd:Q800
-        wd:Q805 wd:Q1028 wd:Q928 wd:Q1037 wd:Q117 wd:Q810 wd:Q817 wd:Q912 wd:Q794
-      }}
+      VALUES ?country {{ wd:{country} }}
       OPTIONAL {{ ?person wdt:P21 ?gender. }}
       OPTIONAL {{ ?person wdt:P106 ?occupation. }}
       OPTIONAL {{ ?person wdt:P569 ?birthDate. }}
       OPTIONAL {{ ?person wdt:P570 ?deathDate. }}
       OPTIONAL {{ ?person wdt:P18 ?image. }}
+      {keyset}
       SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
     }}
+    ORDER BY STR(?person)
     LIMIT {LIMIT}
-    OFFSET {offset}
     """
 
-    url = "https://query.wikidata.org/sparql"
-    headers = {"User-Agent": "AkinatorDataCollector/1.0 (Yousef)"}
-
+def fetch_page(country, after, session, limiter):
+    """Raw SPARQL bindings for one page, or None after repeated failures."""
+    query = build_query(country, after)
     for attempt in range(10):
+        limiter.wait()
         try:
-            response = requests.get(url, params={"format": "json", "query": query}, headers=headers, timeout=60)
+            response = session.get(SPARQL_URL, params={"format": "json", "query": query}, timeout=60)
 
             if response.status_code == 429:
-                print("⚠️ Rate limit reached (HTTP 429). Waiting 60s...")
-                time.sleep(60)
+                wait = _retry_after(response, 60)
+                print(f"⚠️ [{country}] Rate limit reached (HTTP 429). Waiting {wait:.0f}s...")
+                limiter.backoff(wait)
                 continue
 
             if response.status_code != 200:
-                print(f"⚠️ HTTP {response.status_code}. Retrying in 15s...")
+                print(f"⚠️ [{country}] HTTP {response.status_code}. Retrying in 15s...")
                 time.sleep(15)
                 continue
 
-            data = response.json()
-            people = []
-
-            for item in data["results"]["bindings"]:
-                person = {
-                    "name": item.get("personLabel", {}).get("value", "").strip(),
-                    "gender": item.get("genderLabel", {}).get("value", "").strip(),
-                    "country": item.get("countryLabel", {}).get("value", "").strip(),
-                    "occupation": item.get("occupationLabel", {}).get("value", "").strip(),
-                    "birth_date": item.get("birthDate", {}).get("value", "").strip(),
-                    "death_date": item.get("deathDate", {}).get("value", "").strip(),
-                    "image_url": item.get("image", {}).get("value", "").strip(),
-                }
-
-                # Check required fields
-                required = ["name", "gender", "country", "occupation", "birth_date"]
-                if any(not person[f] for f in required):
-                    continue
+            return response.json()["results"]["bindings"]
 
-                # Fetch Wikipedia description
-                description = get_wikipedia_description(person["name"])
-                if not description:
-                    continue  # Skip if no description available
+        except Exception as e:
+            print(f"⚠️ [{country}] Error fetching page: {e}. Retrying in 20s...")
+            time.sleep(20)
 
-                person["description"] = description
-                people.append(person)
+    print(f"❌ [{country}] Failed after several retries, stopping this partition.")
+    return None
 
-            return people
+def _person_iri(item):
+    return item.get("person", {}).get("value", "")
 
-        except Exception as e:
-            print(f"⚠️ Error fetching batch: {e}. Retrying in 20s...")
-            time.sleep(20)
+def split_page(items, after):
+    """(items to keep, next cursor, partition finished) for one keyset page."""
+    if len(items) < LIMIT:
+        return items, (_person_iri(items[-1]) if items else after), True
+    last = _person_iri(items[-1])
+    kept = [i for i in items if _person_iri(i) != last]
+    if not kept:
+        # a single person filled the whole page; take it rather than loop forever
+        return items, last, False
+    return kept, _person_iri(kept[-1]), False
+
+def parse_people(items):
+    rows = []
+    for item in items:
+        person = {
+            "wikidata_id": _person_iri(item).rsplit("/", 1)[-1],
+            "name": item.get("personLabel", {}).get("value", "").strip(),
+            "gender": item.get("genderLabel", {}).get("value", "").strip(),
+            "country": item.get("countryLabel", {}).get("value", "").strip(),
+            "occupation": item.get("occupationLabel", {}).get("value", "").strip(),
+            "birth_date": item.get("birthDate", {}).get("value", "").strip(),
+            "death_date": item.get("deathDate", {}).get("value", "").strip(),
+            "image_url": item.get("image", {}).get("value", "").strip(),
+        }
+
+        # Check required fields
+        required = ["name", "gender", "country", "occupation", "birth_date"]
+        if any(not person[f] for f in required):
+            continue
+        rows.append(person)
+    return rows
+
+def enrich(rows, session, limiter, cache):
+    # Fetch Wikipedia descriptions (once per person, not once per occupation row)
+    descriptions = fetch_descriptions([p["name"] for p in rows], session, limiter, cache=cache)
+    people = []
+    for person in rows:
+        description = descriptions.get(person["name"], "")
+        if not description:
+            continue  # Skip if no description available
+        person["description"] = description
+        people.append(person)
+    return people
+
+# ==============================
+# Checkpoint: append-only JSONL per partition + small state file
+# ==============================
+# Each page is appended to CHECKPOINT_DIR/<country>.jsonl, then state.json is
+# replaced atomically with that partition's cursor, record count and committed
+# byte length.  Resuming only reads state.json; bytes past a partition's
+# committed length (a page interrupted mid-write) are truncated.  compact()
+# streams the partitions in COUNTRIES order, dropping duplicate
+# (person, country, occupation) rows, into the CSV that load_csv expects.
+#
+# Rows of an earlier crawl (the previous crawler's single JSONL up to its
+# committed length, or else an OUTPUT_CSV written before checkpoints existed)
+# are copied once into imported.jsonl by import_legacy, so compact() does not
+# overwrite them.  They carry no Wikidata id: compact() keys them by name and
+# writes them after the partitions, skipping every name the crawl has found.
+def _legacy_rows(csv_path, jsonl_path, state_path):
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            committed = json.load(f)["bytes"]
+        with open(jsonl_path, "rb") as f:
+            data = f.read(committed)
+    except (OSError, ValueError, KeyError):
+        data = None
+    if data is not None:
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    if os.path.exists(csv_path):
+        with open(csv_path, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+def _row_key(person):
+    return (person.get("wikidata_id") or person["name"], person["country"], person["occupation"])
+
+class Checkpoint:
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {"partitions": {}}
+        parts = dict(self.state["partitions"])
+        if IMPORTED in self.state:
+            parts[IMPORTED] = self.state[IMPORTED]
+        for country, part in parts.items():
+            path = self.path(country)
+            if os.path.exists(path) and os.path.getsize(path) > part["bytes"]:
+                with open(path, "r+b") as f:
+                    f.truncate(part["bytes"])
+
+    def path(self, country):
+        return os.path.join(self.directory, f"{country}.jsonl")
+
+    def partition(self, country):
+        with self.lock:
+            return dict(self.state["partitions"].get(
+                country, {"cursor": None, "records": 0, "bytes": 0, "done": False}))
+
+    def records(self):
+        with self.lock:
+            return sum(p["records"] for p in self.state["partitions"].values())
+
+    def _write(self, name, batch):
+        count = 0
+        with open(self.path(name), "ab") as f:
+            for person in batch:
+                f.write((json.dumps(person, ensure_ascii=False) + "\n").encode("utf-8"))
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+            return count, f.tell()
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def append(self, country, batch, cursor, done):
+        count, committed = self._write(country, batch)
+        with self.lock:
+            part = self.state["partitions"].get(country, {"records": 0})
+            self.state["partitions"][country] = {
+                "cursor": cursor, "records": part["records"] + count, "bytes": committed, "done": done,
+            }
+            self._save_state()
+
+    def import_legacy(self, csv_path=OUTPUT_CSV, jsonl_path=LEGACY_JSONL, state_path=LEGACY_STATE):
+        """Copy the rows of an earlier crawl into imported.jsonl, once; returns the rows imported."""
+        with self.lock:
+            if IMPORTED in self.state:
+                return 0
+        open(self.path(IMPORTED), "wb").close()
+        count, committed = self._write(IMPORTED, _legacy_rows(csv_path, jsonl_path, state_path))
+        with self.lock:
+            self.state[IMPORTED] = {"records": count, "bytes": committed}
+            self._save_state()
+        return count
+
+    def compact(self, csv_path=OUTPUT_CSV, order=COUNTRIES):
+        seen = set()
+        crawled = set()
+        count = 0
+        tmp = csv_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8-sig", newline="") as dst:
+            writer = csv.DictWriter(dst, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for country in list(order) + [IMPORTED]:
+                if not os.path.exists(self.path(country)):
+                    continue
+                with open(self.path(country), encoding="utf-8") as src:
+                    for line in src:
+                        if not line.strip():
+                            continue
+                        person = json.loads(line)
+                        if country == IMPORTED:
+                            # crawled rows replace every imported row of the same name
+                            if person["name"] in crawled:
+                                continue
+                        else:
+                            crawled.add(person["name"])
+                        key = _row_key(person)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        writer.writerow(person)
+                        count += 1
+        os.replace(tmp, csv_path)
+        return count
+
+# ==============================
+# Partition worker
+# ==============================
+def crawl_partition(country, checkpoint, session, limiter, stop, cache):
+    part = checkpoint.partition(country)
+    cursor = part["cursor"]
+    while not part["done"] and not stop.is_set():
+        items = fetch_page(country, cursor, session, limiter)
+        if items is None:
+            return
+        items, cursor, done = split_page(items, cursor)
+        people = enrich(parse_people(items), session, limiter, cache)
+        checkpoint.append(country, people, cursor, done)
+        part = checkpoint.partition(country)
+        total = checkpoint.records()
+        print(f"✅ [{country}] +{len(people)} (partition {part['records']}, total {total})")
+        if total >= MAX_RESULTS:
+            stop.set()
+        elif not done:
+            time.sleep(SLEEP_BETWEEN_BATCHES)
 
-    print("❌ Failed after several retries, skipping this batch.")
-    return []
 # ==============================
-# Main Loop (safer: save every batch + save on interrupt)
+# Main Loop (partitions in parallel, checkpoint every page, compact to CSV on exit)
 # ==============================
-try:
-    while len(all_people) < MAX_RESULTS:
-        print(f"\n📡 Fetching batch starting at offset {offset}...")
-        batch = fetch_batch(offset)
-
-        if not batch:
-            print("🚫 No more results. Possibly end of data.")
-            break
-
-        all_people.extend(batch)
-        offset += LIMIT
-        print(f"✅ Collected total: {len(all_people)}")
-
-        # --- Save progress after every batch (safer) ---
-        pd.DataFrame(all_people).to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-        print(f"💾 Saved progress: {len(all_people)} records to {OUTPUT_CSV}")
-
-        # Respect rate limit
-        time.sleep(SLEEP_BETWEEN_BATCHES)
-
-except KeyboardInterrupt:
-    print("\n⛔ Interrupted by user (KeyboardInterrupt). Saving current progress...")
-    pd.DataFrame(all_people).to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"✔️ Saved {len(all_people)} records to {OUTPUT_CSV}. Exiting.")
-except Exception as e:
-    print(f"\n❌ Unexpected error: {e}. Saving current progress before exit...")
-    pd.DataFrame(all_people).to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"✔️ Saved {len(all_people)} records to {OUTPUT_CSV}.")
-    raise
-else:
-    # Final save if loop ended normally
-    pd.DataFrame(all_people).to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"\n🎯 Done! Total {len(all_people)} records saved to {OUTPUT_CSV}.")
+def main():
+    # --- Load previous progress (state file only, never the records) ---
+    checkpoint = Checkpoint()
+    imported = checkpoint.import_legacy()
+    if imported:
+        print(f"Imported {imported} records from the previous crawl.")
+    pending = [c for c in COUNTRIES if not checkpoint.partition(c)["done"]]
+    if checkpoint.records():
+        print(f"Resuming: {checkpoint.records()} records, {len(pending)} partitions left.")
+
+    session = make_session(max(DESCRIPTION_WORKERS, PARTITION_WORKERS))
+    limiter = RateLimiter()
+    stop = threading.Event()
+    cache = {}
+    try:
+        with ThreadPoolExecutor(max_workers=PARTITION_WORKERS) as pool:
+            futures = [pool.submit(crawl_partition, c, checkpoint, session, limiter, stop, cache) for c in pending]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # let running workers finish their current page, skip the rest
+                stop.set()
+                raise
+
+    except KeyboardInterrupt:
+        print("\n⛔ Interrupted by user (KeyboardInterrupt). Writing CSV from checkpoint...")
+        count = checkpoint.compact()
+        print(f"✔️ Saved {count} records to {OUTPUT_CSV}. Exiting.")
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}. Writing CSV from checkpoint before exit...")
+        count = checkpoint.compact()
+        print(f"✔️ Saved {count} records to {OUTPUT_CSV}.")
+        raise
+    else:
+        # Final compaction if the crawl ended normally
+        count = checkpoint.compact()
+        print(f"\n🎯 Done! Total {count} records saved to {OUTPUT_CSV}.")
+
+
+if __name__ == "__main__":
+    main()
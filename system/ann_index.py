@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+# ==============================
+# Approximate nearest neighbours over description embeddings
+# ==============================
+# An IVF (inverted file) index: descriptions are clustered with spherical
+# k-means and a hint only scans the lists of the few centroids closest to it.
+# Built offline next to the embedding matrix and memory-mapped on load; it is
+# tied to the embedding hashes it was built from and ignored once they change.
+
+ANN_THRESHOLD = 5000   # candidate sets at least this large use the ANN index
+DEFAULT_NPROBE = 16
+
+
+def _hashes_digest(hashes):
+    return hashlib.blake2b(np.ascontiguousarray(hashes).tobytes(), digest_size=16).hexdigest()
+
+
+def _dot(matrix, rows, query):
+    # matrix is a float array or an EmbeddingIndex (which dequantizes int8/float16 rows)
+    if hasattr(matrix, "scores"):
+        return matrix.scores(query, rows)
+    return matrix[rows] @ query
+
+
+def _kmeans(matrix, n_lists, iters, seed):
+    rng = np.random.default_rng(seed)
+    centroids = np.array(matrix[rng.choice(len(matrix), n_lists, replace=False)], dtype=np.float32)
+    for _ in range(iters):
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = matrix[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # re-seed empty lists so every centroid stays useful
+                centroids[c] = matrix[rng.integers(len(matrix))]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids, np.argmax(matrix @ centroids.T, axis=1)
+
+
+class IVFIndex:
+    def __init__(self, centroids, order, offsets):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, iters=10, seed=0):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(len(matrix))))
+        n_lists = min(n_lists, len(matrix))
+        centroids, assign = _kmeans(matrix, n_lists, iters, seed)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def search(self, query, matrix, k=10, allowed=None, nprobe=DEFAULT_NPROBE):
+        """Top-k (rows, scores) among rows allowed by the boolean mask, widening the probe until k are found."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        n_lists = len(self.centroids)
+        ranked_lists = np.argsort(-(self.centroids @ query), kind="stable")
+        nprobe = min(max(1, nprobe), n_lists)
+        while True:
+            rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in ranked_lists[:nprobe]])
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if len(rows) >= k or nprobe == n_lists:
+                break
+            nprobe = min(nprobe * 2, n_lists)
+        scores = _dot(matrix, rows, query)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return rows[top], scores[top]
+
+    def save(self, base_path, hashes):
+        np.save(base_path + ".ivf-centroids.npy", self.centroids)
+        np.save(base_path + ".ivf-order.npy", self.order)
+        np.save(base_path + ".ivf-offsets.npy", self.offsets)
+        with open(base_path + ".ivf.json", "w", encoding="utf-8") as f:
+            json.dump({"rows": int(len(hashes)), "hashes": _hashes_digest(hashes)}, f)
+
+    @classmethod
+    def load(cls, base_path, hashes):
+        try:
+            with open(base_path + ".ivf.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["rows"] != len(hashes) or meta["hashes"] != _hashes_digest(hashes):
+                return None
+            return cls(np.load(base_path + ".ivf-centroids.npy", mmap_mode="r"),
+                       np.load(base_path + ".ivf-order.npy", mmap_mode="r"),
+                       np.load(base_path + ".ivf-offsets.npy", mmap_mode="r"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def exact_search(query, matrix, k=10, allowed=None):
+    rows = np.arange(len(matrix)) if allowed is None else np.flatnonzero(allowed)
+    scores = matrix[rows] @ np.asarray(query, dtype=np.float32).reshape(-1)
+    top = np.argsort(-scores, kind="stable")[:k]
+    return rows[top], scores[top]
+
+
+def recall_at_k(ivf, matrix, queries, k=10, allowed=None, nprobe=DEFAULT_NPROBE):
+    """Mean fraction of the exact top-k that the IVF search also returns."""
+    hits = 0
+    total = 0
+    for q in queries:
+        exact, _ = exact_search(q, matrix, k, allowed)
+        approx, _ = ivf.search(q, matrix, k, allowed, nprobe)
+        hits += len(set(exact.tolist()) & set(approx.tolist()))
+        total += len(exact)
+    return hits / total if total else 1.0
+
+
+_ivf_indexes = {}   # (base path, storage) -> (IVFIndex or None, embedding version, ivf.json mtime) it was checked at
+_ivf_lock = threading.Lock()
+
+
+def _meta_mtime(base_path):
+    try:
+        return os.stat(base_path + ".ivf.json").st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_ann_index(index):
+    """IVF index for an EmbeddingIndex, or None if it was never built or is stale.
+
+    Call it after index.ensure(): the result is re-validated against the
+    embedding hashes whenever ensure re-encoded rows, and a missing or stale
+    index is looked up again once its files change (e.g. ann_index.py was run).
+    """
+    if not index.base_path:
+        return None
+    mtime = _meta_mtime(index.base_path)
+    with _ivf_lock:
+        key = (index.base_path, index.storage)
+        cached = _ivf_indexes.get(key)
+        if cached is not None and cached[1] == index.version and cached[2] == mtime:
+            return cached[0]
+        ivf = IVFIndex.load(index.base_path, index.hashes) if mtime is not None else None
+        _ivf_indexes[key] = (ivf, index.version, mtime)
+        return ivf
+
+
+if __name__ == "__main__":
+    # python ann_index.py path/to/arabic_personalities.csv
+    from main import load_csv, collapse_entities, get_nlp_model
+    from embedding_index import build_embedding_index
+    df = collapse_entities(load_csv(sys.argv[1]))
+    index, _ = build_embedding_index(df, get_nlp_model())
+    matrix = index.vectors()
+    ivf = IVFIndex.build(matrix)
+    ivf.save(index.base_path, index.hashes)
+
+    # recall@10 against the exact scan, with perturbed descriptions as queries
+    rng = np.random.default_rng(0)
+    queries = matrix[rng.choice(len(matrix), min(200, len(matrix)), replace=False)]
+    queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    allowed = rng.random(len(matrix)) < 0.5
+    print(f"{len(ivf.centroids)} lists over {len(matrix)} rows -> {index.base_path}.ivf-*.npy")
+    print(f"recall@10: {recall_at_k(ivf, matrix, queries):.3f} "
+          f"(with 50% candidate mask: {recall_at_k(ivf, matrix, queries, allowed=allowed):.3f})")
@@ -0,0 +1,477 @@
+import argparse
+import http.client
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from main import (AkinatorEngine, BayesianAkinatorEngine, LEXICAL_TOP_K, RANGE_QUESTIONS, collapse_entities,
+                  get_nlp_model, load_csv, rank_rows, start_model_loading)
+from candidates import CandidateIndex, parse_years
+from dataset_cache import text_column
+from embedding_index import EmbeddingIndex, HintBatcher, build_embedding_index, quantize
+from lexical_index import get_lexical_index
+from server import SessionStore, make_server
+
+# ==============================
+# Benchmarks
+# ==============================
+# python benchmark.py hint [--sizes 3 30 300] > hint.json
+# python benchmark.py server [--sessions 300 --workers 32] > server.json
+# python benchmark.py quant [--hints 200] > quant.json
+# python benchmark.py lexical [--hints 200 --scale 50000] > lexical.json
+# python benchmark.py games [--scale 10000 50000 200000 --games 100] > games.json
+# Every run prints one JSON document so results can be diffed between commits.
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "arabic_personalities.csv")
+HINT_SIZES = [3, 10, 30, 100, 300, 1000, 3000]
+SAMPLE_HINTS = ["football player", "egyptian actor", "politician and diplomat", "singer and composer"]
+HELD_OUT_HINTS = [
+    "former national team goalkeeper", "film director and screenwriter", "president of a football club",
+    "novelist who wrote short stories", "islamic scholar", "olympic athlete", "minister of foreign affairs",
+    "famous comedian", "television presenter", "footballer who played for al ahly", "economist and lawyer",
+    "actress in egyptian cinema",
+]
+QUANT_STORAGES = ["float16", "int8"]
+QUANT_MIN_RECALL = 0.95   # recall@10 against the float32 ranking a quantized mode must keep
+FINAL_CANDIDATES = 3      # the GUI and server stop asking at this many candidates
+MAX_QUESTIONS = 60
+
+
+def _ms(t0):
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def _percentiles(samples):
+    a = np.asarray(samples, dtype=float)
+    return {
+        "n": int(len(a)),
+        "mean": round(float(a.mean()), 3),
+        "p50": round(float(np.percentile(a, 50)), 3),
+        "p90": round(float(np.percentile(a, 90)), 3),
+        "p99": round(float(np.percentile(a, 99)), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+
+def bench_hint(df, sizes=HINT_SIZES, repeats=5, seed=0):
+    """Per-hint latency as a function of the number of surviving candidates.
+
+    cold: no embeddings cached, every surviving description is encoded (what
+    the hint stage cost per hint before the persisted index).
+    warm: descriptions already in the index, only the hint is encoded (or found
+    in the hint cache once a sample hint repeats).
+    """
+    model = get_nlp_model()
+    build_embedding_index(df, model)
+    descriptions = text_column(df, 'description')
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sorted(set(min(n, len(df)) for n in list(sizes) + [len(df)])):
+        cold, warm = [], []
+        for r in range(repeats):
+            rows = np.sort(rng.choice(len(df), n, replace=False))
+            hint = SAMPLE_HINTS[r % len(SAMPLE_HINTS)]
+
+            index = EmbeddingIndex(None, len(df))
+            t0 = time.perf_counter()
+            index.ensure(rows, descriptions[rows], model)
+            query = model.encode(hint, convert_to_numpy=True, normalize_embeddings=True)
+            int(index.scores(query, rows).argmax())
+            cold.append(_ms(t0))
+
+            t0 = time.perf_counter()
+            int(rank_rows(df, rows, hint).argmax())
+            warm.append(_ms(t0))
+        results.append({"candidates": int(n), "cold_ms": _percentiles(cold), "warm_ms": _percentiles(warm)})
+    return results
+
+
+def _held_out_hints(df, n, seed=0):
+    """Fixed hints plus the opening words of randomly chosen descriptions."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(df), min(n, len(df)), replace=False)
+    texts = text_column(df, 'description', rows)
+    return list(HELD_OUT_HINTS) + [" ".join(str(t).split()[:6]) for t in texts]
+
+
+def bench_lexical(df, n_hints=200, seed=0):
+    """Hint ranking over every row: BM25 shortlist + embedding re-rank vs embedding scores for all rows.
+
+    Hints are the opening words of random descriptions; a hint is a hit when
+    the chosen row has the target's description (synthetic copies share it).
+    """
+    model = get_nlp_model()
+    index, _ = build_embedding_index(df, model)
+    t0 = time.perf_counter()
+    lexical = get_lexical_index(df)
+    load_ms = _ms(t0)
+    rng = np.random.default_rng(seed)
+    targets = rng.choice(len(df), min(n_hints, len(df)), replace=False)
+    descriptions = text_column(df, 'description')
+    hints = [" ".join(str(t).split()[:6]) for t in descriptions[targets]]
+    rows = np.arange(len(df))
+    semantic_ms, hybrid_ms, shortlist_sizes = [], [], []
+    semantic_hits, hybrid_hits, agree = 0, 0, 0
+    for hint, target in zip(hints, targets):
+        query = model.encode(hint, convert_to_numpy=True, normalize_embeddings=True)
+        t0 = time.perf_counter()
+        semantic = int(np.argmax(index.scores(query, rows)))
+        semantic_ms.append(_ms(t0))
+        t0 = time.perf_counter()
+        short = lexical.shortlist(hint, rows, LEXICAL_TOP_K)
+        hybrid = int(short[np.argmax(index.scores(query, rows[short]))]) if len(short) else semantic
+        hybrid_ms.append(_ms(t0))
+        shortlist_sizes.append(len(short))
+        semantic_hits += descriptions[semantic] == descriptions[target]
+        hybrid_hits += descriptions[hybrid] == descriptions[target]
+        agree += semantic == hybrid
+    return {
+        "rows": len(df),
+        "hints": len(hints),
+        "terms": len(lexical.vocab),
+        "index_load_or_build_ms": round(load_ms, 3),
+        "semantic": {"hit_rate": round(semantic_hits / len(hints), 4), "score_ms": _percentiles(semantic_ms)},
+        "hybrid": {"hit_rate": round(hybrid_hits / len(hints), 4), "score_ms": _percentiles(hybrid_ms),
+                   "shortlist": _percentiles(shortlist_sizes)},
+        "top1_agreement": round(agree / len(hints), 4),
+    }
+
+
+def bench_quantized(df, storages=QUANT_STORAGES, n_hints=200, k=10, seed=0):
+    """Ranking agreement and memory of quantized embeddings against the float32 index.
+
+    The quantized matrices are built from the float32 vectors exactly as
+    EmbeddingIndex.ensure would store them, so no re-encoding is needed.
+    """
+    model = get_nlp_model()
+    base, _ = build_embedding_index(df, model, storage="float32")
+    reference = base.vectors()
+    rows = np.arange(len(df))
+    hints = _held_out_hints(df, n_hints, seed)
+
+    # encoding: one model call per hint vs one batched call for all pending hints
+    batcher = HintBatcher(lambda: model)
+    t0 = time.perf_counter()
+    for hint in hints:
+        batcher.encode(hint)
+    sequential = _ms(t0) / len(hints)
+    t0 = time.perf_counter()
+    queries = batcher.encode_many(hints)
+    batched = _ms(t0) / len(hints)
+
+    exact_scores = np.stack([reference @ q for q in queries])
+    exact_top = np.argsort(-exact_scores, axis=1, kind="stable")[:, :k]
+    report = {
+        "hints": len(hints),
+        "rows": len(df),
+        "encode_ms_per_hint": {"sequential": round(sequential, 3), "batched": round(batched, 3)},
+        "storage": [],
+    }
+    for storage in ["float32"] + list(storages):
+        index = EmbeddingIndex(None, len(df), dim=reference.shape[1], storage=storage)
+        stored, scale = quantize(reference, storage)
+        index.matrix[:] = stored
+        if scale is not None:
+            index.scale[:] = scale
+        recall, top1, err, latency = [], [], [], []
+        for q, top, exact in zip(queries, exact_top, exact_scores):
+            t0 = time.perf_counter()
+            scores = index.scores(q, rows)
+            latency.append(_ms(t0))
+            approx = np.argsort(-scores, kind="stable")[:k]
+            recall.append(len(set(top.tolist()) & set(approx.tolist())) / len(top))
+            top1.append(approx[0] == top[0])
+            err.append(float(np.abs(scores - exact).max()))
+        report["storage"].append({
+            "storage": storage,
+            "bytes": int(index.nbytes),
+            "memory_ratio": round(index.nbytes / base.nbytes, 3),
+            "recall_at_k": round(float(np.mean(recall)), 4),
+            "top1_agreement": round(float(np.mean(top1)), 4),
+            "max_abs_score_error": round(float(np.max(err)), 5),
+            "score_ms": _percentiles(latency),
+            "within_tolerance": bool(np.mean(recall) >= QUANT_MIN_RECALL),
+        })
+    return report
+
+
+def oracle_answer(row, col, val):
+    """Truthful answer for a target row (set-valued cells answer by membership)."""
+    if col == 'alive':
+        return 'yes' if row['alive'] else 'no'
+    if col in RANGE_QUESTIONS:
+        cell = row[col]
+        years = parse_years(list(cell) if isinstance(cell, tuple) else [cell])
+        return 'yes' if (years < val).any() else 'no'
+    cell = row[col]
+    if isinstance(cell, tuple):
+        return 'yes' if val in cell else 'no'
+    return 'yes' if cell == val else 'no'
+
+
+_QUESTION = re.compile(r"^Is the character's (\w+) '(.*)'\?$")
+
+
+def _parse_question(text):
+    if text == "Is the character still alive?":
+        return 'alive', None
+    for col, template in RANGE_QUESTIONS.items():
+        head, tail = template.split("{}")
+        if text.startswith(head) and text.endswith(tail):
+            return col, int(text[len(head):len(text) - len(tail)])
+    m = _QUESTION.match(text)
+    return m.group(1), m.group(2)
+
+
+def synthesize(df, n_rows, seed=0):
+    """Scale the entity table to n_rows by resampling entities; half of the copies take another entity's occupations."""
+    if n_rows <= len(df):
+        out = df.iloc[:n_rows].reset_index(drop=True)
+    else:
+        rng = np.random.default_rng(seed)
+        picks = rng.integers(len(df), size=n_rows - len(df))
+        extra = df.iloc[picks].reset_index(drop=True)
+        swap = rng.random(len(extra)) < 0.5
+        donors = rng.integers(len(df), size=int(swap.sum()))
+        occupation = extra['occupation'].to_numpy().copy()
+        occupation[swap] = df['occupation'].to_numpy()[donors]
+        extra['occupation'] = occupation
+        extra['name'] = [f"{name} #{i}" for i, name in enumerate(extra['name'])]
+        out = pd.concat([df, extra], ignore_index=True)
+    out.attrs = {"rows": len(out)}   # no source: nothing synthetic is persisted next to the CSV
+    if "text" in df.attrs:
+        out.attrs["text"] = df.attrs["text"]   # text refs still point into the CSV's store
+    return out
+
+
+def play_game(engine, target, timings, noise=0.0, rng=None):
+    """Answer for the target row (wrongly with probability noise) until the engine is down to its final candidates."""
+    questions = 0
+    while engine.count() > FINAL_CANDIDATES and questions < MAX_QUESTIONS:
+        t0 = time.perf_counter()
+        q = engine.next_question()
+        timings["next_question"].append(_ms(t0))
+        if q is None:
+            break
+        col, val, _ = q
+        ans = oracle_answer(target, col, val)
+        if noise and rng.random() < noise:
+            ans = 'no' if ans == 'yes' else 'yes'
+        t0 = time.perf_counter()
+        engine.apply_answer(col, val, ans)
+        timings["apply_answer"].append(_ms(t0))
+        questions += 1
+    t0 = time.perf_counter()
+    best = engine.best_guess()
+    timings["best_guess"].append(_ms(t0))
+    return questions, best
+
+
+def bench_games(df, games=100, hints=True, seed=0, bayesian=False, noise=0.0, lookahead=0):
+    """Simulated games against AkinatorEngine with an oracle answering for a random target."""
+    if bayesian:
+        engine_cls = BayesianAkinatorEngine
+    else:
+        def engine_cls(df, index):
+            return AkinatorEngine(df, index=index, lookahead=lookahead)
+    t0 = time.perf_counter()
+    index = CandidateIndex(df)
+    index_ms = _ms(t0)
+    t0 = time.perf_counter()
+    engine_cls(df, index=index)   # builds (or loads) the opening-question tree or planner
+    tree_ms = _ms(t0)
+
+    rng = np.random.default_rng(seed)
+    targets = rng.choice(len(df), games, replace=games > len(df))
+    timings = {"next_question": [], "apply_answer": [], "best_guess": [], "hint": []}
+    questions, remaining, survived, top1 = [], [], 0, 0
+    descriptions = text_column(df, 'description')
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for target_row in targets:
+        target = df.iloc[target_row]
+        engine = engine_cls(df, index=index)
+        n_questions, best = play_game(engine, target, timings, noise, rng)
+        rows = engine.rows()
+        questions.append(n_questions)
+        remaining.append(len(rows))
+        survived += int(target_row in rows)
+        top1 += int(best is not None and best['name'] == target['name'])
+        if hints and len(rows):
+            # what HintWorker.run does: rank the surviving candidates against the hint
+            hint = " ".join(str(descriptions[target_row]).split()[:6])
+            t1 = time.perf_counter()
+            int(rank_rows(df, rows, hint).argmax())
+            timings["hint"].append(_ms(t1))
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": len(df),
+        "games": games,
+        "engine": "BayesianAkinatorEngine" if bayesian else "AkinatorEngine",
+        "lookahead": lookahead,
+        "answer_noise": noise,
+        "setup_ms": {"candidate_index": round(index_ms, 3), "question_tree": round(tree_ms, 3)},
+        "wall_s": round(wall, 3),
+        "step_ms": {k: _percentiles(v) for k, v in timings.items() if v},
+        "questions_to_guess": _percentiles(questions),
+        "final_remaining": _percentiles(remaining),
+        "target_survived": round(survived / games, 3),
+        "target_is_best_guess": round(top1 / games, 3),
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def bench_server(df, sessions=300, workers=32, seed=0):
+    """Load test: many games held open at once against one in-process server, played over HTTP."""
+    store = SessionStore(df)
+    server = make_server(store, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    rng = np.random.default_rng(seed)
+    targets = rng.choice(len(df), sessions, replace=sessions > len(df))
+
+    create_ms, answer_ms, final_remaining = [], [], []
+    lock = threading.Lock()
+    state = [None] * sessions   # last response per game (carries the session id)
+    peak = [0]
+    found = [0]
+
+    def request(conn, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        t0 = time.perf_counter()
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        data = json.loads(conn.getresponse().read())
+        return data, _ms(t0)
+
+    def worker(slots):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        local_create, local_answer = [], []
+        for i in slots:
+            data, ms = request(conn, "POST", "/sessions")
+            state[i] = data
+            local_create.append(ms)
+        with lock:
+            peak[0] = max(peak[0], len(store.sessions))
+        # answer one question per open game per round, so every game stays open until it ends
+        open_slots = [i for i in slots if not state[i]["done"]]
+        while open_slots:
+            still_open = []
+            for i in open_slots:
+                col, val = _parse_question(state[i]["question"])
+                ans = oracle_answer(df.iloc[targets[i]], col, val)
+                data, ms = request(conn, "POST", f"/sessions/{state[i]['session']}/answer", {"answer": ans})
+                data["session"] = state[i]["session"]
+                state[i] = data
+                local_answer.append(ms)
+                if not data["done"]:
+                    still_open.append(i)
+            open_slots = still_open
+        # sanity check: truthful answers must never eliminate the target
+        hits = sum(1 for i in slots if targets[i] in store.get(state[i]["session"]).engine.rows())
+        remaining = [state[i]["remaining"] for i in slots]
+        conn.close()
+        with lock:
+            create_ms.extend(local_create)
+            answer_ms.extend(local_answer)
+            final_remaining.extend(remaining)
+            found[0] += hits
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(list(range(w, sessions, workers)),)) for w in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    server.shutdown()
+    requests_total = len(create_ms) + len(answer_ms)
+    return {
+        "sessions": sessions,
+        "workers": workers,
+        "peak_open_sessions": peak[0],
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(requests_total / wall, 1),
+        "create_ms": _percentiles(create_ms),
+        "answer_ms": _percentiles(answer_ms),
+        "questions_per_game": round(len(answer_ms) / sessions, 2),
+        "final_remaining": _percentiles(final_remaining),
+        "target_survived": round(found[0] / sessions, 3),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the question loop and hint stage.")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_hint = sub.add_parser("hint", help="hint latency vs surviving candidates")
+    p_hint.add_argument("--sizes", type=int, nargs="+", default=HINT_SIZES)
+    p_hint.add_argument("--repeats", type=int, default=5)
+
+    p_server = sub.add_parser("server", help="concurrent games against the session server")
+    p_server.add_argument("--sessions", type=int, default=300)
+    p_server.add_argument("--workers", type=int, default=32)
+
+    p_games = sub.add_parser("games", help="simulated games against the engine, optionally on a scaled-up dataset")
+    p_games.add_argument("--scale", type=int, nargs="*", default=[],
+                         help="also run on synthetic datasets of these sizes (e.g. 10000 50000 200000)")
+    p_games.add_argument("--games", type=int, default=100)
+    p_games.add_argument("--no-hints", action="store_true", help="skip the hint stage (no sentence model needed)")
+    p_games.add_argument("--bayesian", action="store_true", help="play with BayesianAkinatorEngine")
+    p_games.add_argument("--lookahead", type=int, default=0, help="plan this many questions ahead")
+    p_games.add_argument("--noise", type=float, default=0.0, help="probability that the oracle answers wrongly")
+
+    p_quant = sub.add_parser("quant", help="quantized embedding storage vs float32")
+    p_quant.add_argument("--hints", type=int, default=200)
+    p_quant.add_argument("--storages", nargs="+", default=QUANT_STORAGES)
+
+    p_lexical = sub.add_parser("lexical", help="BM25 prefilter + embedding re-rank vs embeddings alone")
+    p_lexical.add_argument("--hints", type=int, default=200)
+    p_lexical.add_argument("--scale", type=int, nargs="*", default=[])
+
+    args = parser.parse_args(argv)
+    start_model_loading()
+    df = collapse_entities(load_csv(args.csv))
+
+    report = {"command": args.command, "dataset_rows": len(df)}
+    if args.command == "hint":
+        report["hint"] = bench_hint(df, args.sizes, args.repeats)
+    elif args.command == "server":
+        report["server"] = bench_server(df, args.sessions, args.workers)
+    elif args.command == "games":
+        report["games"] = [bench_games(d, args.games, not args.no_hints, bayesian=args.bayesian, noise=args.noise,
+                                       lookahead=args.lookahead)
+                           for d in [df] + [synthesize(df, n) for n in args.scale]]
+    elif args.command == "quant":
+        report["quant"] = bench_quantized(df, args.storages, args.hints)
+    elif args.command == "lexical":
+        report["lexical"] = [bench_lexical(d, args.hints) for d in [df] + [synthesize(df, n) for n in args.scale]]
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
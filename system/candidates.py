@@ -0,0 +1,205 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Candidate bitsets
+# ==============================
+# Probe columns are encoded once as integer category codes and every
+# (column, value) pair gets a packed bitset (one bit per row, 64 rows per
+# uint64 word).  A game's live candidate set is a single bitset that answers
+# are AND-ed into, so filtering never allocates a DataFrame.
+#
+# Year columns are probed with range questions ("born before 1950?").  Their
+# known years are sorted once; the yes count of every threshold over a
+# candidate set is then one cumulative sum along that order.
+
+RANGE_COLUMNS = ['birth_date', 'death_date']
+PROBE_COLUMNS = ['gender', 'country', 'occupation', 'alive'] + RANGE_COLUMNS
+RANGE_BITS_CACHE = 256   # range bitsets kept per index
+# the shipped CSV holds bare years, the crawler writes Wikidata's raw "1922-11-14T00:00:00Z" values
+YEAR_PATTERN = r'^([+-]?\d{1,4})(?:\D|$)'
+
+
+def parse_years(values):
+    """Leading signed year of each value as float (NaN if none): "1942", "1922-11-14T00:00:00Z", "-0500-01-01"."""
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    return pd.to_numeric(text.str.extract(YEAR_PATTERN, expand=False), errors='coerce').to_numpy(dtype=float, copy=True)
+
+
+def pack_flags(flags, words):
+    packed = np.packbits(np.asarray(flags, dtype=bool), bitorder='little')
+    out = np.zeros(words * 8, dtype=np.uint8)
+    out[:len(packed)] = packed
+    return out.view(np.uint64)
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(mask):
+        return int(np.bitwise_count(mask).sum())
+else:  # numpy < 2.0
+    def popcount(mask):
+        return int(np.unpackbits(mask.view(np.uint8)).sum())
+
+
+def _pairs(series):
+    values = series.to_numpy(dtype=object)
+    if not any(isinstance(v, tuple) for v in values):
+        return np.arange(len(values)), values
+    lengths = np.fromiter((len(v) if isinstance(v, tuple) else 1 for v in values), dtype=np.int64, count=len(values))
+    cells = [x for v in values for x in (v if isinstance(v, tuple) else (v,))]
+    return np.repeat(np.arange(len(values)), lengths), np.array(cells, dtype=object)
+
+
+class CandidateIndex:
+    def __init__(self, df, columns=PROBE_COLUMNS):
+        self.n = len(df)
+        self.words = (self.n + 63) // 64
+        self.columns = list(columns)
+        # per column, one (row, value code) pair per value a row holds; set-valued
+        # columns (tuples, see main.collapse_entities) give several pairs per row
+        self.pair_rows = {}
+        self.codes = {}
+        self.values = {}
+        self.bits = {}
+        self.blank = {}
+        self._lookup = {}
+        self.years = {}          # earliest known year per row, the one thresholds count
+        self.latest_years = {}
+        self.year_order = {}
+        self.thresholds = {}
+        self.threshold_starts = {}
+        self.latest_order = {}
+        self.latest_starts = {}
+        # LRU of range bitsets; the index is shared by every server session's thread
+        self._range_bits = OrderedDict()
+        self._range_lock = threading.Lock()
+        for col in self.columns:
+            if col in RANGE_COLUMNS:
+                self._index_years(col, df[col])
+                continue
+            pair_rows, cells = _pairs(df[col])
+            codes, uniques = pd.factorize(cells)
+            codes = codes.astype(np.int32)
+            self.pair_rows[col] = pair_rows
+            self.codes[col] = codes
+            self.values[col] = list(uniques)
+            self._lookup[col] = {v: i for i, v in enumerate(self.values[col])}
+            self.blank[col] = np.array([not str(v).strip() for v in self.values[col]], dtype=bool)
+            self.bits[col] = self._value_bits(pair_rows, codes, len(uniques))
+        self._empty = np.zeros(self.words, dtype=np.uint64)
+
+    def _value_bits(self, pair_rows, codes, n_values):
+        bits = np.zeros((n_values, self.words), dtype=np.uint64)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_values))])
+        for i in range(n_values):
+            flags = np.zeros(self.n, dtype=bool)
+            flags[pair_rows[order[bounds[i]:bounds[i + 1]]]] = True
+            bits[i] = pack_flags(flags, self.words)
+        return bits
+
+    def _index_years(self, col, series):
+        pair_rows, cells = _pairs(series)
+        parsed = parse_years(cells)
+        # a few crawled dates are garbled (BC years without a sign, typos); drop the impossible ones
+        parsed[parsed > date.today().year] = np.nan
+        # names merged by collapse_entities can hold several years: keep the earliest and the latest
+        years = np.full(self.n, np.inf)
+        latest = np.full(self.n, -np.inf)
+        np.fmin.at(years, pair_rows, parsed)
+        np.fmax.at(latest, pair_rows, parsed)
+        years[np.isinf(years)] = np.nan
+        latest[np.isinf(latest)] = np.nan
+        self.latest_years[col] = latest
+        known = np.flatnonzero(~np.isnan(years))
+        order = known[np.argsort(years[known], kind='stable')]
+        distinct, starts = np.unique(years[order], return_index=True)
+        self.years[col] = years
+        self.year_order[col] = order
+        # "before thresholds[j]" is yes for the rows order[:threshold_starts[j]]
+        self.thresholds[col] = distinct[1:].astype(np.int64)
+        self.threshold_starts[col] = starts[1:]
+        # ... and no is ruled out for the rows latest_order[:latest_starts[j]] (every year before it)
+        latest_order = known[np.argsort(latest[known], kind='stable')]
+        self.latest_order[col] = latest_order
+        self.latest_starts[col] = np.searchsorted(latest[latest_order], self.thresholds[col], side='left')
+
+    def range_counts(self, col, flags):
+        """(yes, no) counts of every threshold of col among flagged rows, as answer_bits splits them.
+
+        A row holding years on both sides of a threshold counts on both sides.
+        flags may also be float weights, giving (yes, no) masses.
+        """
+        below = np.concatenate([[0], np.cumsum(flags[self.year_order[col]])])
+        all_below = np.concatenate([[0], np.cumsum(flags[self.latest_order[col]])])
+        return below[self.threshold_starts[col]], flags.sum() - all_below[self.latest_starts[col]]
+
+    def full_mask(self):
+        return pack_flags(np.ones(self.n, dtype=bool), self.words)
+
+    def code_of(self, col, val):
+        return self._lookup[col].get(val)
+
+    def bits_for(self, col, val):
+        if col in self.years:
+            return self._before_bits(col, val)
+        # the alive question is asked without a value: "is the character still alive?"
+        if col == 'alive' and val is None:
+            val = True
+        i = self._lookup[col].get(val)
+        return self._empty if i is None else self.bits[col][i]
+
+    def answer_bits(self, col, val, yes):
+        """Rows consistent with a yes (or no) answer to the question (col, val)."""
+        if col in self.years:
+            # yes keeps a row if any of its years is before val, no if any is not (or none is known)
+            return self._before_bits(col, val) if yes else ~self._before_bits(col, val, latest=True)
+        bits = self.bits_for(col, val)
+        return bits if yes else ~bits
+
+    def _before_bits(self, col, year, latest=False):
+        key = (col, int(year), latest)
+        with self._range_lock:
+            bits = self._range_bits.get(key)
+            if bits is not None:
+                self._range_bits.move_to_end(key)
+                return bits
+        years = self.latest_years[col] if latest else self.years[col]
+        with np.errstate(invalid='ignore'):
+            bits = pack_flags(years < int(year), self.words)
+        with self._range_lock:
+            self._range_bits[key] = bits
+            while len(self._range_bits) > RANGE_BITS_CACHE:
+                self._range_bits.popitem(last=False)
+        return bits
+
+    def count(self, mask):
+        return popcount(mask)
+
+    def flags(self, mask):
+        return np.unpackbits(mask.view(np.uint8), count=self.n, bitorder='little').view(bool)
+
+    def rows(self, mask):
+        return np.flatnonzero(self.flags(mask))
+
+    def value_counts(self, col, rows):
+        """Value codes present among rows (in order of first appearance) and their counts, in one pass."""
+        pair_rows = self.pair_rows[col]
+        if len(pair_rows) == self.n:
+            codes = self.codes[col][rows]
+        else:
+            live = np.zeros(self.n, dtype=bool)
+            live[rows] = True
+            codes = self.codes[col][live[pair_rows]]
+        present, first = np.unique(codes, return_index=True)
+        present = present[np.argsort(first, kind='stable')]
+        counts = np.bincount(codes, minlength=len(self.values[col]))
+        return present, counts[present]
+
+    def value_weights(self, col, weights):
+        """Total row weight holding each value code of col (one weighted bincount over the pairs)."""
+        return np.bincount(self.codes[col], weights=weights[self.pair_rows[col]], minlength=len(self.values[col]))
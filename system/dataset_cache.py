@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Columnar dataset cache
+# ==============================
+# load_csv streams the CSV in chunks into <csv>.cache/ next to it: every
+# column is stored as int32 category codes plus its distinct values packed
+# into one UTF-8 blob with character offsets, and derived boolean columns are
+# stored as-is.  meta.json records the CSV's mtime and size; any change to the
+# CSV makes the cache stale and it is rebuilt.
+#
+# Long text columns (description, image_url) are not loaded at all: they go
+# to an offset-indexed text store (<col>.text blob + byte offsets) and the
+# frame only carries a <col>_ref column with the row each value lives at.
+# text_column / with_text read them back on demand for the rows that need it.
+# A frame's refs only make sense against the store it was loaded with, so
+# load_cache opens the stores right away and df.attrs['text'] names that
+# version (cache dir + meta.json stamp); a later rebuild opens new stores
+# next to them instead of swapping them under frames already loaded.
+
+CACHE_VERSION = 2
+TEXT_COLUMNS = ['description', 'image_url']
+CHUNK_ROWS = 50_000
+
+
+def cache_dir(csv_path):
+    return csv_path + ".cache"
+
+
+def _stamp(csv_path):
+    st = os.stat(csv_path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _save(path, array):
+    # written aside and renamed, so a process still mapping the old file keeps reading it intact
+    tmp = path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _pack_text(values):
+    text = "".join(values)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8), offsets
+
+
+def _unpack_text(blob, offsets):
+    text = bytes(blob).decode("utf-8")
+    bounds = offsets.tolist()
+    return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+# ==============================
+# Offset-indexed text store
+# ==============================
+class TextStore:
+    """One text column as a UTF-8 blob plus byte offsets, both memory-mapped; rows decode on demand."""
+
+    def __init__(self, base):
+        self.offsets = np.load(base + ".offsets.npy", mmap_mode="r")
+        size = int(self.offsets[-1]) if len(self.offsets) else 0
+        self.blob = np.memmap(base + ".text", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, i):
+        if i < 0:
+            return ""
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def take(self, rows):
+        return [self.get(int(i)) for i in rows]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+
+class _TextWriter:
+    def __init__(self, base):
+        self.base = base
+        self.f = open(base + ".text.tmp", "wb")
+        self.offsets = [np.zeros(1, dtype=np.int64)]
+        self.size = 0
+
+    def append(self, values):
+        encoded = [str(v).encode("utf-8") for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        self.offsets.append(self.size + np.cumsum(lengths))
+        self.size += int(lengths.sum())
+        self.f.write(b"".join(encoded))
+
+    def close(self):
+        self.f.close()
+        _save(self.base + ".offsets.npy", np.concatenate(self.offsets))
+        os.replace(self.base + ".text.tmp", self.base + ".text")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_text_store(text, col):
+    """Shared store of a text column, as it was when the frame with attrs['text'] == text was loaded."""
+    key = (text["dir"], text["mtime_ns"], text["size"], col)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = TextStore(os.path.join(text["dir"], col))
+        return _stores[key]
+
+
+def text_column(df, col, rows=None):
+    """Values of a text column for the given positions (all rows by default), read from the store if needed."""
+    if col in df.columns:
+        values = df[col].to_numpy()
+        return values if rows is None else values[np.asarray(rows, dtype=np.int64)]
+    refs = df[col + "_ref"].to_numpy()
+    if rows is not None:
+        refs = refs[np.asarray(rows, dtype=np.int64)]
+    return np.array(get_text_store(df.attrs["text"], col).take(refs), dtype=object)
+
+
+def with_text(frame):
+    """Copy of a (small) frame with its text columns filled in from the store."""
+    missing = [col for col in TEXT_COLUMNS if col not in frame.columns and col + "_ref" in frame.columns]
+    if not missing:
+        return frame
+    frame = frame.copy()
+    for col in missing:
+        frame[col] = text_column(frame, col)
+    return frame
+
+
+def row_with_text(df, i):
+    return with_text(df.iloc[[i]]).iloc[0]
+
+
+# ==============================
+# Build / load
+# ==============================
+def _encode(values, table):
+    # chunk-local factorize, then map the chunk's uniques onto the running global codes
+    codes, uniques = pd.factorize(values)
+    mapping = np.fromiter((table.setdefault(v, len(table)) for v in uniques), dtype=np.int32, count=len(uniques))
+    return mapping[codes]
+
+
+def save_cache(csv_path, chunks):
+    """Write the cache from an iterator of DataFrame chunks (the CSV is never held in memory at once)."""
+    out = cache_dir(csv_path)
+    meta_path = os.path.join(out, "meta.json")
+    writers = {}
+    try:
+        os.makedirs(out, exist_ok=True)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        columns = None
+        tables, codes, flags = {}, {}, {}
+        rows = 0
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+                for col in columns:
+                    if col in TEXT_COLUMNS:
+                        writers[col] = _TextWriter(os.path.join(out, col))
+                    elif chunk[col].dtype == bool:
+                        flags[col] = []
+                    else:
+                        tables[col], codes[col] = {}, []
+            for col in columns:
+                if col in writers:
+                    writers[col].append(chunk[col].tolist())
+                elif col in flags:
+                    flags[col].append(chunk[col].to_numpy(dtype=bool))
+                else:
+                    codes[col].append(_encode(chunk[col].to_numpy(dtype=object), tables[col]))
+            rows += len(chunk)
+        if columns is None:
+            return False
+        for w in writers.values():
+            w.close()
+        meta = dict(_stamp(csv_path), version=CACHE_VERSION, rows=rows, text=[], flags=[],
+                    stores=list(writers))
+        for i, col in enumerate(columns):
+            if col in flags:
+                _save(os.path.join(out, f"{i}.flags.npy"), np.concatenate(flags[col]))
+                meta["flags"].append(col)
+            elif col in tables:
+                blob, offsets = _pack_text([str(v) for v in tables[col]])
+                _save(os.path.join(out, f"{i}.codes.npy"), np.concatenate(codes[col]))
+                _save(os.path.join(out, f"{i}.blob.npy"), blob)
+                _save(os.path.join(out, f"{i}.offsets.npy"), offsets)
+                meta["text"].append(col)
+        meta["columns"] = columns
+        # meta.json goes last so a half-written cache is never considered valid
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        return True
+    except OSError:
+        for w in writers.values():
+            if not w.f.closed:
+                w.f.close()
+        return False
+
+
+def load_cache(csv_path):
+    out = cache_dir(csv_path)
+    try:
+        meta_path = os.path.join(out, "meta.json")
+        text = dict(_stamp(meta_path), dir=out)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION or {k: meta.get(k) for k in ("mtime_ns", "size")} != _stamp(csv_path):
+            return None
+        for col in meta["stores"]:
+            get_text_store(text, col)
+        if _stamp(meta_path) != {k: text[k] for k in ("mtime_ns", "size")}:
+            return None   # rebuilt while the stores were being opened
+        data = {}
+        for i, col in enumerate(meta["columns"]):
+            if col in meta["stores"]:
+                data[col + "_ref"] = np.arange(meta["rows"], dtype=np.int64)
+                continue
+            if col in meta["flags"]:
+                data[col] = np.load(os.path.join(out, f"{i}.flags.npy"), mmap_mode="r")
+                continue
+            codes = np.load(os.path.join(out, f"{i}.codes.npy"), mmap_mode="r")
+            blob = np.load(os.path.join(out, f"{i}.blob.npy"), mmap_mode="r")
+            offsets = np.load(os.path.join(out, f"{i}.offsets.npy"), mmap_mode="r")
+            values = np.array(_unpack_text(blob, offsets), dtype=object)
+            if col == "name":
+                data[col] = pd.Series(values[codes], dtype=str)
+            else:
+                # few distinct values: keep the codes, not one string per row
+                data[col] = pd.Categorical.from_codes(np.asarray(codes), categories=pd.Index(values, dtype=object))
+    except (OSError, ValueError, KeyError):
+        return None
+    df = pd.DataFrame(data)
+    for col in meta["flags"]:
+        df[col] = df[col].astype(bool)
+    df.attrs["text"] = text
+    return df
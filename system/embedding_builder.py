@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dataset_cache import text_column
+from embedding_index import description_digest, get_embedding_index, quantize
+
+# ==============================
+# Offline sharded embedding build
+# ==============================
+# EmbeddingIndex.ensure encodes stale rows on demand in one process.  For a
+# full (re)build this CLI sorts the stale descriptions by length, cuts them
+# into shards of similar-length texts (little padding per batch) and encodes
+# the shards in a process pool, each worker limited to a few BLAS/torch
+# threads.  Every finished shard is written to <index>.emb-shards/ under a name
+# derived from its rows and description hashes, so an interrupted build skips
+# the shards already on disk when it is rerun.  Once all shards are there they
+# are merged into the index's memory-mapped matrix, aligned with the row ids,
+# and the shard directory is removed.
+#
+#   python embedding_builder.py path/to/arabic_personalities.csv [--workers 4 --threads 2]
+
+SHARD_ROWS = 2048
+BATCH_SIZE = 64
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+_worker_model = None
+
+
+def shard_dir(index):
+    return index.matrix_path[:-len(".npy")] + "-shards"
+
+
+def plan_shards(rows, texts, digests, shard_rows=SHARD_ROWS):
+    """(key, rows, digests, texts) per shard; rows are ordered by description length so shards hold similar lengths."""
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    order = np.lexsort((rows, lengths))
+    shards = []
+    for start in range(0, len(order), shard_rows):
+        sel = order[start:start + shard_rows]
+        shard_rows_ids, shard_digests = rows[sel], digests[sel]
+        key = hashlib.blake2b(shard_rows_ids.tobytes() + shard_digests.tobytes(), digest_size=12).hexdigest()
+        shards.append((key, shard_rows_ids, shard_digests, [texts[i] for i in sel]))
+    return shards
+
+
+def _init_worker(threads):
+    global _worker_model
+    # thread limits have to be in place before torch is imported
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    from main import MODEL_NAME
+    _worker_model = SentenceTransformer(MODEL_NAME, device="cpu")
+
+
+def _encode_shard(path, texts, batch_size):
+    vecs = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, np.asarray(vecs, dtype=np.float32))
+    os.replace(tmp, path)
+    return path
+
+
+def build_sharded(df, storage=None, workers=None, threads=None, shard_rows=SHARD_ROWS, batch_size=BATCH_SIZE,
+                  log=sys.stderr):
+    """Encode every row whose stored description hash is stale; returns (index, rows encoded)."""
+    index = get_embedding_index(df, storage)
+    if not index.matrix_path:
+        raise ValueError("the frame has no source CSV to build the embedding files next to")
+    if index.read_only:
+        # opened copy-on-write: the merge would only change private memory
+        raise PermissionError(f"the embedding files next to the CSV are not writable: {index.matrix_path}")
+    cpus = os.cpu_count() or 1
+    workers = workers or max(1, cpus // (threads or 2))
+    threads = threads or max(1, cpus // workers)
+
+    rows = np.arange(len(df), dtype=np.int64)
+    texts = [str(t) for t in text_column(df, "description")]
+    digests = np.fromiter((description_digest(t) for t in texts), dtype=np.uint64, count=len(texts))
+    stale = np.flatnonzero(np.asarray(index.hashes) != digests)
+    if not len(stale):
+        return index, 0
+    shards = plan_shards(rows[stale], [texts[i] for i in stale], digests[stale], shard_rows)
+
+    out = shard_dir(index)
+    os.makedirs(out, exist_ok=True)
+    paths = {key: os.path.join(out, key + ".npy") for key, _, _, _ in shards}
+    todo = [(key, t) for key, _, _, t in shards if not os.path.exists(paths[key])]
+    print(f"{len(stale)} stale rows in {len(shards)} shards, {len(shards) - len(todo)} already on disk; "
+          f"{workers} workers x {threads} threads", file=log)
+    t0 = time.perf_counter()
+    if todo:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(threads,)) as pool:
+            futures = [pool.submit(_encode_shard, paths[key], t, batch_size) for key, t in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                print(f"  shard {done}/{len(todo)} ({time.perf_counter() - t0:.1f}s)", file=log)
+
+    # merge: vectors first, hashes last, so an interrupted merge only leaves rows marked stale
+    for key, shard_rows_ids, shard_digests, _ in shards:
+        stored, scale = quantize(np.load(paths[key]), index.storage)
+        index.matrix[shard_rows_ids] = stored
+        if scale is not None:
+            index.scale[shard_rows_ids] = scale
+    index.flush()
+    for key, shard_rows_ids, shard_digests, _ in shards:
+        index.hashes[shard_rows_ids] = shard_digests
+    index.flush()
+    shutil.rmtree(out, ignore_errors=True)
+    return index, len(stale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the description embedding index with a process pool.")
+    parser.add_argument("csv")
+    parser.add_argument("--csv-rows", action="store_true",
+                        help="index CSV rows instead of the collapsed entities the game uses")
+    parser.add_argument("--storage", choices=["float32", "float16", "int8"])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads", type=int, help="torch / BLAS threads per worker")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from main import load_csv, collapse_entities
+    df = load_csv(args.csv)
+    if not args.csv_rows:
+        df = collapse_entities(df)
+    t0 = time.perf_counter()
+    index, encoded = build_sharded(df, args.storage, args.workers, args.threads, args.shard_rows, args.batch_size)
+    print(f"Encoded {encoded} of {index.n_rows} descriptions in {time.perf_counter() - t0:.1f}s -> "
+          f"{index.matrix_path} ({index.nbytes / 2**20:.1f} MiB, {index.storage})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from dataset_cache import text_column
+
+# ==============================
+# Persisted description embeddings
+# ==============================
+# The matrix lives next to the CSV as a float32 .npy file (memory-mapped on
+# load), one row per dataset row id.  A parallel uint64 array holds a hash of
+# the description each row was built from, so rows whose text changed (or that
+# were never encoded) are re-encoded on demand and everything else is reused.
+#
+# Large corpora can store the vectors quantized instead: float16, or int8 with
+# one float32 scale per row (about a quarter of the float32 size).  Scores are
+# a plain NumPy dot product either way.
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+EMBEDDING_STORAGE = os.environ.get("AKINATOR_EMBEDDING_STORAGE", "float32")
+
+
+def description_digest(text):
+    digest = hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest()
+    # 0 is reserved for "not encoded yet"
+    return int.from_bytes(digest, "little") or 1
+
+
+def quantize(vecs, storage):
+    """(stored vectors, per-row scale) for normalized float32 vectors; the scale is None unless int8."""
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if storage != "int8":
+        return vecs.astype(STORAGE_DTYPES[storage]), None
+    scale = np.abs(vecs).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    return np.rint(vecs / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+
+class EmbeddingIndex:
+    def __init__(self, base_path, n_rows, dim=EMBEDDING_DIM, storage=None):
+        self.base_path = base_path
+        self.n_rows = n_rows
+        self.dim = dim
+        self.storage = storage or EMBEDDING_STORAGE
+        self.dtype = STORAGE_DTYPES[self.storage]
+        suffix = ".emb" if self.storage == "float32" else f".emb-{self.storage}"
+        self.matrix_path = base_path + suffix + ".npy" if base_path else None
+        self.hash_path = base_path + suffix + "-hash.npy" if base_path else None
+        self.scale_path = base_path + suffix + "-scale.npy" if base_path and self.storage == "int8" else None
+        self.scale = None
+        self.read_only = False
+        self.version = 0   # bumped whenever rows are re-encoded (ann_index re-validates on change)
+        # rows whose hash was already checked against the loaded text this session
+        self._checked = np.zeros(n_rows, dtype=bool)
+        self._lock = threading.Lock()
+        self._open()
+
+    def _load(self, mode):
+        """(matrix, hashes, scale) memory-mapped from existing files, or None if missing or mismatched."""
+        int8 = self.storage == "int8"
+        try:
+            matrix = np.load(self.matrix_path, mmap_mode=mode)
+            hashes = np.load(self.hash_path, mmap_mode=mode)
+            scale = np.load(self.scale_path, mmap_mode=mode) if int8 else None
+        except (OSError, ValueError):
+            return None
+        if (matrix.shape == (self.n_rows, self.dim) and matrix.dtype == self.dtype
+                and hashes.shape == (self.n_rows,) and hashes.dtype == np.uint64
+                and (not int8 or (scale.shape == (self.n_rows,) and scale.dtype == np.float32))):
+            return matrix, hashes, scale
+        return None
+
+    def _open(self):
+        int8 = self.storage == "int8"
+        if self.matrix_path:
+            loaded = self._load("r+")
+            if loaded is None:
+                # read-only files: use the prebuilt index copy-on-write; rows encoded
+                # this session stay in memory and are never written back
+                loaded = self._load("c")
+                self.read_only = loaded is not None
+            if loaded is not None:
+                self.matrix, self.hashes, self.scale = loaded
+                return
+            try:
+                self.matrix = np.lib.format.open_memmap(
+                    self.matrix_path, mode="w+", dtype=self.dtype, shape=(self.n_rows, self.dim))
+                self.hashes = np.lib.format.open_memmap(
+                    self.hash_path, mode="w+", dtype=np.uint64, shape=(self.n_rows,))
+                if int8:
+                    self.scale = np.lib.format.open_memmap(
+                        self.scale_path, mode="w+", dtype=np.float32, shape=(self.n_rows,))
+                return
+            except OSError:
+                # read-only data dir: keep the index in memory for this session
+                pass
+        self.matrix = np.zeros((self.n_rows, self.dim), dtype=self.dtype)
+        self.hashes = np.zeros(self.n_rows, dtype=np.uint64)
+        self.scale = np.ones(self.n_rows, dtype=np.float32) if int8 else None
+
+    @property
+    def nbytes(self):
+        """Bytes held by the vectors (and int8 scales), excluding the hash array."""
+        return self.matrix.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def ensure(self, rows, texts, model, batch_size=64):
+        """Encode the given rows whose stored hash does not match their description.
+
+        texts are the rows' descriptions, or a callable giving the descriptions of
+        rows[positions], so rows already checked in this process are never decoded.
+        """
+        with self._lock:
+            return self._ensure(rows, texts, model, batch_size)
+
+    def _ensure(self, rows, texts, model, batch_size):
+        rows = np.asarray(rows, dtype=np.int64)
+        unchecked = ~self._checked[rows]
+        if not unchecked.any():
+            return 0
+        if callable(texts):
+            texts = list(texts(np.flatnonzero(unchecked)))
+        else:
+            texts = [t for t, u in zip(texts, unchecked) if u]
+        rows = rows[unchecked]
+        digests = np.fromiter((description_digest(t) for t in texts), dtype=np.uint64, count=len(rows))
+        stale = np.asarray(self.hashes[rows]) != digests
+        if stale.any():
+            stale_rows = rows[stale]
+            vecs = model.encode([t for t, s in zip(texts, stale) if s], batch_size=batch_size,
+                                convert_to_numpy=True, normalize_embeddings=True)
+            stored, scale = quantize(vecs, self.storage)
+            self.matrix[stale_rows] = stored
+            if scale is not None:
+                self.scale[stale_rows] = scale
+            self.hashes[stale_rows] = digests[stale]
+            self.version += 1
+            self.flush()
+        self._checked[rows] = True
+        return int(stale.sum())
+
+    def scores(self, query, rows):
+        """Cosine similarity of a normalized query vector against the given rows."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.storage == "float32":
+            return self.matrix[rows] @ query
+        scores = self.matrix[rows].astype(np.float32) @ query
+        if self.scale is not None:
+            scores *= self.scale[rows]
+        return scores
+
+    def vectors(self, rows=None):
+        """Dequantized float32 vectors (all rows by default)."""
+        rows = np.arange(self.n_rows) if rows is None else np.asarray(rows, dtype=np.int64)
+        vecs = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.scale is not None:
+            vecs = vecs * self.scale[rows][:, None]
+        return vecs
+
+    def flush(self):
+        if isinstance(self.matrix, np.memmap) and not self.read_only:
+            self.matrix.flush()
+            self.hashes.flush()
+            if self.scale is not None:
+                self.scale.flush()
+
+
+# ==============================
+# Hint embedding cache
+# ==============================
+# Hints repeat: goto_final re-encodes the accumulated "previous + new" hint on
+# every retry and different players type the same common hints ("singer",
+# "football player").  HintBatcher looks hints up here by normalized text
+# (lowercase, single spaces) before queueing them for the model.
+
+HINT_CACHE_SIZE = int(os.environ.get("AKINATOR_HINT_CACHE_SIZE", "1024"))
+
+
+def normalize_hint(text):
+    return " ".join(str(text).lower().split())
+
+
+class HintCache:
+    """Thread-safe LRU of hint embeddings keyed by normalized text, with hit/miss counters."""
+
+    def __init__(self, maxsize=HINT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, key, vec):
+        if self.maxsize <= 0:
+            return
+        vec = np.array(vec, dtype=np.float32)
+        vec.flags.writeable = False
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+class _PendingHint:
+    __slots__ = ("text", "done", "vector", "error")
+
+    def __init__(self, text):
+        self.text = text
+        self.done = threading.Event()
+        self.vector = None
+        self.error = None
+
+
+class HintBatcher:
+    """Encodes hints from concurrent callers (GUI workers, server sessions) in shared model.encode calls.
+
+    Whatever is queued while the previous batch is encoding goes out together as
+    the next batch; max_wait optionally holds a batch open a little longer.
+    """
+
+    def __init__(self, get_model, max_batch=32, max_wait=0.0, cache=None):
+        self.get_model = get_model
+        self.cache = cache
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.encoded = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts):
+        if self.cache is None:
+            return self._encode_pending(list(texts))
+        keys = [normalize_hint(t) for t in texts]
+        vectors = [self.cache.get(k) for k in keys]
+        missing = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+        if missing:
+            found = dict(zip(missing, self._encode_pending(missing)))
+            for k, v in found.items():
+                self.cache.put(k, v)
+            vectors = [found[k] if v is None else v for k, v in zip(keys, vectors)]
+        return np.stack(vectors) if vectors else np.zeros((0, EMBEDDING_DIM), np.float32)
+
+    def _encode_pending(self, texts):
+        pending = [_PendingHint(t) for t in texts]
+        self._start()
+        for p in pending:
+            self._queue.put(p)
+        for p in pending:
+            p.done.wait()
+            if p.error is not None:
+                raise p.error
+        return np.stack([p.vector for p in pending]) if pending else np.zeros((0, EMBEDDING_DIM), np.float32)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hint-encoder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vecs = self.get_model().encode([p.text for p in batch], batch_size=len(batch),
+                                               convert_to_numpy=True, normalize_embeddings=True)
+                for p, v in zip(batch, np.asarray(vecs, dtype=np.float32)):
+                    p.vector = v
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            self.batches += 1
+            self.encoded += len(batch)
+            for p in batch:
+                p.done.set()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_embedding_index(df, storage=None):
+    """Shared index for the dataset a frame (or any filtered view of it) came from."""
+    source = df.attrs.get("index_base", df.attrs.get("source"))
+    n_rows = df.attrs.get("rows", len(df))
+    storage = storage or EMBEDDING_STORAGE
+    key = (source, n_rows, storage)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = EmbeddingIndex(source, n_rows, storage=storage)
+        return _indexes[key]
+
+
+def build_embedding_index(df, model, batch_size=64, storage=None):
+    index = get_embedding_index(df, storage)
+    encoded = index.ensure(df.index.to_numpy(), text_column(df, "description").tolist(), model, batch_size=batch_size)
+    return index, encoded
+
+
+if __name__ == "__main__":
+    # python embedding_index.py path/to/arabic_personalities.csv [float32|float16|int8]
+    # (single process; embedding_builder.py encodes a full build in parallel, resumable shards)
+    from main import load_csv, collapse_entities, get_nlp_model
+    # the game ranks collapsed entities, so that is the index worth prebuilding
+    df = collapse_entities(load_csv(sys.argv[1]))
+    index, encoded = build_embedding_index(df, get_nlp_model(), storage=sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Encoded {encoded} of {index.n_rows} descriptions -> {index.matrix_path} "
+          f"({index.nbytes / 2**20:.1f} MiB, {index.storage})")
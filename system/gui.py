@@ -1,40 +1,44 @@
 # Revised gui.py — compatible with AkinatorEngine in main.py
 import sys
-import requests
-from io import BytesIO
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QLabel,
     QHBoxLayout, QMessageBox, QProgressBar, QLineEdit, QSizePolicy, QScrollArea
 )
-from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt, pyqtSignal, QThread
-from main import load_csv, akinator_probabilistic_step
+from image_loader import ImageLoader
+from dataset_cache import row_with_text
+from main import load_csv, collapse_entities, display_value, akinator_probabilistic_step, start_model_loading
+
+PREFETCH_TOP_K = 5
+PREFETCH_MAX_CANDIDATES = 20
 
 
 class HintWorker(QThread):
     finished = pyqtSignal(object)
 
-    def __init__(self, candidates_df, combined_hint, excluded_names):
+    def __init__(self, df, rows, combined_hint, excluded_names):
         super().__init__()
-        self.candidates_df = candidates_df
+        # df is the shared, read-only dataset; only the live row ids cross the thread boundary
+        self.df = df
+        self.rows = rows
         self.combined_hint = combined_hint
         self.excluded_names = excluded_names
 
     def run(self):
         try:
             import main
-            nlp_model = main.nlp_model
-            util = main.util
-            candidates = self.candidates_df[~self.candidates_df['name'].isin(self.excluded_names)].copy()
-            if len(candidates) == 0:
+            rows = self.rows
+            if self.excluded_names:
+                names = self.df['name'].to_numpy()[rows]
+                rows = rows[~np.isin(names, list(self.excluded_names))]
+            if len(rows) == 0:
                 self.finished.emit(None)
                 return
 
-            hint_embedding = nlp_model.encode(self.combined_hint, convert_to_tensor=True)
-            desc_embeddings = nlp_model.encode(candidates['description'].tolist(), convert_to_tensor=True)
-            cos_scores = util.cos_sim(hint_embedding, desc_embeddings)[0]
-            best_idx = int(cos_scores.argmax().item())
-            best_row = candidates.iloc[best_idx]
+            cos_scores = main.rank_rows(self.df, rows, self.combined_hint)
+            best_idx = int(cos_scores.argmax())
+            best_row = row_with_text(self.df, rows[best_idx])
             self.finished.emit(best_row)
         except Exception:
             self.finished.emit(None)
@@ -128,6 +132,12 @@ class QuestionWindow(QWidget):
         self.last_guess_name = None
         self.hint_worker = None
 
+        # images: async, cached, prefetched for the leading candidates
+        self._image_url = None
+        self.images = ImageLoader((self.image_label.width(), self.image_label.height()))
+        self.images.loaded.connect(self.on_image_loaded)
+        self.images.failed.connect(self.on_image_failed)
+
     def start(self):
         q = self.controller.next_question()
         self.update_ui(q)
@@ -152,6 +162,7 @@ class QuestionWindow(QWidget):
 
     def answer(self, user_answer):
         done = self.controller.process_answer(user_answer)
+        self.images.prefetch(self.controller.top_image_urls())
         if done:
             # switch to final/hint stage (GUI will request hints)
             self.update_ui(None)
@@ -170,10 +181,10 @@ class QuestionWindow(QWidget):
 
         name = row.get('name', '')
         gender = row.get('gender', '')
-        country = row.get('country', '')
-        occupation = row.get('occupation', '')
-        birth = row.get('birth_date', '')
-        death = row.get('death_date', '')
+        country = display_value(row.get('country', ''))
+        occupation = display_value(row.get('occupation', ''))
+        birth = display_value(row.get('birth_date', ''))
+        death = display_value(row.get('death_date', ''))
         alive = "Yes" if row.get('alive', False) else "No"
         desc = row.get('description', '') or ''
         img_url = row.get('image_url', '') or ''
@@ -190,23 +201,14 @@ class QuestionWindow(QWidget):
         )
         self.details_label.setText(details)
 
-        # load image (non-blocking would be nicer, but keep simple)
-        self.image_label.setText("Loading image...")
+        # load image on the loader's worker threads; on_image_loaded fills it in
+        self._image_url = img_url
         if img_url:
-            try:
-                resp = requests.get(img_url, timeout=6)
-                if resp.status_code == 200:
-                    data = resp.content
-                    pix = QPixmap()
-                    if pix.loadFromData(data):
-                        scaled = pix.scaled(self.image_label.width(), self.image_label.height(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                        self.image_label.setPixmap(scaled)
-                    else:
-                        self.image_label.setText("Image load failed")
-                else:
-                    self.image_label.setText("Image not found")
-            except Exception:
-                self.image_label.setText("Image error")
+            pix = self.images.request(img_url)
+            if pix is not None:
+                self.image_label.setPixmap(pix)
+            else:
+                self.image_label.setText("Loading image...")
         else:
             self.image_label.setText("No image")
 
@@ -214,6 +216,14 @@ class QuestionWindow(QWidget):
         self.confirm_yes_btn.setVisible(True)
         self.confirm_no_btn.setVisible(True)
 
+    def on_image_loaded(self, url, pix):
+        if url == self._image_url:
+            self.image_label.setPixmap(pix)
+
+    def on_image_failed(self, url, error):
+        if url == self._image_url:
+            self.image_label.setText(error)
+
     # ------------------ Hint workflow ------------------
     def submit_hint(self):
         raw = self.hint_input.text().strip()
@@ -223,14 +233,14 @@ class QuestionWindow(QWidget):
         # handle 'idk' / empty hint -> list remaining candidates
         if raw.lower() in ['idk', "i don't know", "i dont know", "dont know"]:
             # show remaining candidates
-            remaining = self.controller.get_all_candidates(exclude=self.excluded_names)
+            remaining = self.controller.top_candidates(200, exclude=self.excluded_names)  # limit
             if remaining is None or len(remaining) == 0:
                 self.details_label.setText("No remaining candidates.")
             else:
                 lines = []
-                for _, r in remaining.sort_values('score', ascending=False).iterrows():
-                    lines.append(f"{r['name']} — {r.get('occupation','')} — {'Alive' if r['alive'] else 'Deceased'}")
-                text = "<br>".join(lines[:200])  # limit
+                for _, r in remaining.iterrows():
+                    lines.append(f"{r['name']} — {display_value(r.get('occupation',''))} — {'Alive' if r['alive'] else 'Deceased'}")
+                text = "<br>".join(lines)
                 self.details_label.setText("<b>Remaining candidates:</b><br>" + text)
             return
 
@@ -245,8 +255,8 @@ class QuestionWindow(QWidget):
         self.hint_input.setEnabled(False)
         self.progress.setRange(0, 0)  # busy indicator
 
-        candidates_df = self.controller.df.copy()
-        self.hint_worker = HintWorker(candidates_df, self.combined_hint, self.excluded_names.copy())
+        self.hint_worker = HintWorker(self.controller.df, self.controller.live_rows(),
+                                      self.combined_hint, self.excluded_names.copy())
         self.hint_worker.finished.connect(self.on_hint_result)
         self.hint_worker.start()
 
@@ -293,8 +303,10 @@ class Controller:
     The AkinatorEngine in main.py provides:
       - next_question() -> (col, val, q) or None
       - apply_answer(col, val, ans)
-      - best_guess() -> pandas Series
-      - possible attribute (DataFrame)
+      - best_guess() -> {'row', 'name', 'score'}; person(guess) -> pandas Series with text
+      - top_k(k, exclude) -> best candidates first, without sorting all of them
+      - count() -> number of live candidates
+      - possible attribute (DataFrame, built lazily from the candidate mask)
     This Controller normalizes to GUI expectations.
     """
     def __init__(self, df):
@@ -308,7 +320,7 @@ class Controller:
             return None
         col, val, q_text = nxt
         self._last_q = (col, val)
-        remaining = len(self.engine.possible) if hasattr(self.engine, "possible") else len(self.df)
+        remaining = self.engine.count()
         return (q_text, remaining)
 
     def process_answer(self, ans):
@@ -319,15 +331,12 @@ class Controller:
         if self._last_q is None:
             return True  # nothing to process -> final stage
         col, val = self._last_q
-        # map 'yes'/'no'/'idk' behavior
-        if ans == 'idk':
-            # treat as no change; continue probing
-            return False
+        # 'idk' does not filter; the engine only marks the question as asked
         self.engine.apply_answer(col, val, ans)
         # reset last question
         self._last_q = None
         # if few candidates left or no best question next -> final stage
-        if len(self.engine.possible) <= 3:
+        if self.engine.count() <= 3:
             return True
         # otherwise there may still be questions
         next_q = self.engine.next_question()
@@ -336,17 +345,33 @@ class Controller:
         return False
 
     def best_guess(self):
-        return self.engine.best_guess()
+        guess = self.engine.best_guess()
+        return None if guess is None else self.engine.person(guess)
+
+    def top_image_urls(self, k=PREFETCH_TOP_K):
+        # only worth fetching once the game has narrowed down to a handful of people
+        if self.engine.count() > PREFETCH_MAX_CANDIDATES:
+            return []
+        top = self.engine.top_k(k)
+        return [u for u in top['image_url'].tolist() if u]
+
+    def live_rows(self):
+        return self.engine.rows()
+
+    def top_candidates(self, k, exclude=None):
+        return self.engine.top_k(k, exclude or ())
 
     def get_all_candidates(self, exclude=None):
         if exclude is None:
             exclude = set()
-        df = self.engine.possible if hasattr(self.engine, "possible") else self.df
+        df = self.engine.possible
         return df[~df['name'].isin(exclude)].copy()
 
 
 def main():
-    df = load_csv("/mnt/youssef/python_projects/akinator/data/arabic_personalities.csv")
+    # the hint model loads in the background while questions are being asked
+    start_model_loading()
+    df = collapse_entities(load_csv("/mnt/youssef/python_projects/akinator/data/arabic_personalities.csv"))
     app = QApplication(sys.argv)
 
     controller = Controller(df)
@@ -0,0 +1,140 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+
+# ==============================
+# Non-blocking image loading for the GUI
+# ==============================
+# Downloads run on a small thread pool over one pooled requests.Session.
+# Raw bytes are kept in an on-disk cache keyed by URL; decoded images are
+# scaled on the worker (QImage is thread-safe, QPixmap is not) and the GUI
+# thread keeps an LRU of ready-to-show QPixmaps.
+
+IMAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "aniktor", "images")
+HEADERS = {"User-Agent": "AkinatorDataCollector/1.0 (Yousef)"}
+
+
+def _cache_path(cache_dir, url):
+    return os.path.join(cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+
+class _Signals(QObject):
+    done = pyqtSignal(str, object, str)
+
+
+class _Download(QRunnable):
+    def __init__(self, loader, url):
+        super().__init__()
+        self.loader = loader
+        self.url = url
+
+    def run(self):
+        data = None
+        error = ""
+        path = _cache_path(self.loader.cache_dir, self.url) if self.loader.cache_dir else None
+        try:
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+            else:
+                resp = self.loader.session.get(self.url, headers=HEADERS, timeout=self.loader.timeout)
+                if resp.status_code == 200:
+                    data = resp.content
+                    if path:
+                        self.loader.store(path, data)
+                else:
+                    error = "Image not found"
+        except Exception:
+            error = "Image error"
+
+        image = None
+        if data is not None:
+            image = QImage()
+            if image.loadFromData(data):
+                width, height = self.loader.size
+                image = image.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio,
+                                     Qt.TransformationMode.SmoothTransformation)
+            else:
+                image = None
+                error = "Image load failed"
+        self.loader._signals.done.emit(self.url, image, error)
+
+
+class ImageLoader(QObject):
+    loaded = pyqtSignal(str, QPixmap)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, size, cache_dir=IMAGE_CACHE_DIR, memory_items=64, workers=4, timeout=6, session=None):
+        super().__init__()
+        self.size = size
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(workers)
+        self._memory = OrderedDict()
+        self._pending = set()
+        self._signals = _Signals()
+        self._signals.done.connect(self._on_done)
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError:
+                self.cache_dir = None
+
+    def cached(self, url):
+        pix = self._memory.get(url)
+        if pix is not None:
+            self._memory.move_to_end(url)
+        return pix
+
+    def request(self, url):
+        """Return the pixmap if it is in memory, else start loading it and emit loaded/failed later."""
+        pix = self.cached(url)
+        if pix is None:
+            self._start(url, priority=1)
+        return pix
+
+    def prefetch(self, urls):
+        for url in urls:
+            if url and url not in self._memory:
+                self._start(url, priority=0)
+
+    def store(self, path, data):
+        # called from worker threads; write-then-rename keeps readers from seeing partial files
+        tmp = f"{path}.{os.getpid()}.{id(data)}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _start(self, url, priority):
+        if url in self._pending:
+            return
+        self._pending.add(url)
+        self.pool.start(_Download(self, url), priority)
+
+    def _on_done(self, url, image, error):
+        self._pending.discard(url)
+        if image is None:
+            self.failed.emit(url, error)
+            return
+        pix = QPixmap.fromImage(image)
+        self._memory[url] = pix
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        self.loaded.emit(url, pix)
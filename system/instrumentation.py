@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+
+# ==============================
+# Opt-in per-stage timers and counters
+# ==============================
+# An engine (and the hint path) records into a Metrics object:
+#
+#   with metrics.stage("next_question"): ...     timer per stage
+#   metrics.incr("question_tree_hits")            counter
+#   metrics.gauge("candidates", n)                last value
+#
+# Every record is also passed to the sinks as a small event dict, so a log, a
+# callback or a metrics exporter can subscribe.  Engines default to
+# NULL_METRICS, whose stage() hands back one shared no-op context manager and
+# whose enabled flag lets callers skip work (like counting candidates) that
+# only feeds the metrics.
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullMetrics:
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def incr(self, name, n=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "t0")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class Metrics:
+    """Thread-safe stage timings (count / sum / max seconds), counters and gauges."""
+
+    enabled = True
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.stages = {}     # name -> [count, total seconds, max seconds]
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                self.stages[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+        self._emit({"type": "stage", "name": name, "seconds": seconds})
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        self._emit({"type": "counter", "name": name, "value": n})
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+        self._emit({"type": "gauge", "name": name, "value": value})
+
+    def _emit(self, event):
+        for sink in self.sinks:
+            sink(event)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {k: {"count": c, "sum_s": t, "max_s": m} for k, (c, t, m) in self.stages.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+
+def log_sink(logger=None, level=logging.DEBUG):
+    """Sink that writes every event to a logger."""
+    logger = logger or logging.getLogger("akinator.metrics")
+
+    def sink(event):
+        if event["type"] == "stage":
+            logger.log(level, "%s took %.3f ms", event["name"], event["seconds"] * 1000.0)
+        else:
+            logger.log(level, "%s %s = %s", event["type"], event["name"], event["value"])
+    return sink
+
+
+def prometheus_text(metrics, prefix="akinator"):
+    """Prometheus text exposition of a Metrics snapshot."""
+    snap = metrics.snapshot()
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent per engine stage.",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    for name, s in sorted(snap["stages"].items()):
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {s["sum_s"]:.9f}')
+    lines.append(f"# TYPE {prefix}_stage_seconds_max gauge")
+    for name, s in sorted(snap["stages"].items()):
+        lines.append(f'{prefix}_stage_seconds_max{{stage="{name}"}} {s["max_s"]:.9f}')
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    for name, value in sorted(snap["gauges"].items()):
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+
+from dataset_cache import text_column
+
+# ==============================
+# BM25 inverted index over names and descriptions
+# ==============================
+# Hints often carry exact tokens (a name, a city, a club) that the sentence
+# embedding blurs.  A BM25 index over name + description answers those in a
+# few postings lookups: the hint stage takes the top-k lexical matches among
+# the surviving candidates as a shortlist and only that shortlist is encoded
+# and re-ranked with embeddings.  Postings are stored CSR-style by term, each
+# with its precomputed BM25 term-frequency weight, so a query is one weighted
+# bincount.  Built once next to the CSV and memory-mapped on load; it is tied
+# to a digest of the indexed text and rebuilt when that changes.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_TOKEN_LEN = 2
+FILE_SUFFIX = ".bm25"
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(str(text).lower()) if len(t) >= MIN_TOKEN_LEN]
+
+
+def _documents(df):
+    names = df["name"].to_numpy(dtype=object)
+    descriptions = text_column(df, "description")
+    return [f"{n} {d}" for n, d in zip(names, descriptions)]
+
+
+def _text_digest(docs):
+    h = hashlib.blake2b(digest_size=16)
+    for doc in docs:
+        h.update(doc.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class BM25Index:
+    def __init__(self, vocab, offsets, docs, weights, idf, n_docs, digest):
+        self.vocab = vocab          # term -> term id
+        self.offsets = offsets      # postings of term t: docs[offsets[t]:offsets[t + 1]]
+        self.docs = docs
+        self.weights = weights
+        self.idf = idf
+        self.n_docs = n_docs
+        self.digest = digest
+
+    @classmethod
+    def build(cls, documents, digest=None, k1=BM25_K1, b=BM25_B):
+        vocab = {}
+        term_ids, lengths = [], np.zeros(len(documents), dtype=np.int64)
+        for i, doc in enumerate(documents):
+            tokens = tokenize(doc)
+            lengths[i] = len(tokens)
+            term_ids.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
+        terms = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+        # one posting per (term, doc), sorted by term then doc, with its term frequency
+        pairs, tf = np.unique(terms * len(documents) + doc_ids, return_counts=True)
+        post_terms, post_docs = np.divmod(pairs, max(len(documents), 1))
+        doc_freq = np.bincount(post_terms, minlength=len(vocab))
+        offsets = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+        avgdl = max(float(lengths.mean()) if len(lengths) else 0.0, 1.0)
+        norm = k1 * (1.0 - b + b * lengths[post_docs] / avgdl)
+        weights = (tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        idf = np.log1p((len(documents) - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        return cls(vocab, offsets, post_docs.astype(np.int32), weights, idf, len(documents), digest)
+
+    def scores(self, query):
+        """BM25 score of every document for the query (each distinct query term counted once)."""
+        ids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not ids:
+            return None
+        spans = [np.arange(self.offsets[t], self.offsets[t + 1]) for t in ids]
+        postings = np.concatenate(spans)
+        contrib = self.weights[postings] * np.repeat(self.idf[ids], [len(s) for s in spans])
+        return np.bincount(self.docs[postings], weights=contrib, minlength=self.n_docs)
+
+    def shortlist(self, query, rows, k):
+        """Positions into rows of the (at most) k best lexical matches, best first; empty if nothing matches."""
+        scores = self.scores(query)
+        if scores is None:
+            return np.zeros(0, dtype=np.int64)
+        scores = scores[rows]
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        return hits[np.lexsort((hits, -scores[hits]))]
+
+    def save(self, base_path):
+        np.save(base_path + FILE_SUFFIX + "-offsets.npy", self.offsets)
+        np.save(base_path + FILE_SUFFIX + "-docs.npy", self.docs)
+        np.save(base_path + FILE_SUFFIX + "-weights.npy", self.weights)
+        np.save(base_path + FILE_SUFFIX + "-idf.npy", self.idf)
+        tmp = base_path + FILE_SUFFIX + ".json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": self.n_docs, "digest": self.digest, "vocab": list(self.vocab)}, f, ensure_ascii=False)
+        # the json goes last so a half-written index is never loaded
+        os.replace(tmp, base_path + FILE_SUFFIX + ".json")
+
+    @classmethod
+    def load(cls, base_path, n_docs, digest):
+        try:
+            with open(base_path + FILE_SUFFIX + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["rows"] != n_docs or meta["digest"] != digest:
+                return None
+            vocab = {t: i for i, t in enumerate(meta["vocab"])}
+            return cls(vocab,
+                       np.load(base_path + FILE_SUFFIX + "-offsets.npy", mmap_mode="r"),
+                       np.load(base_path + FILE_SUFFIX + "-docs.npy", mmap_mode="r"),
+                       np.load(base_path + FILE_SUFFIX + "-weights.npy", mmap_mode="r"),
+                       np.load(base_path + FILE_SUFFIX + "-idf.npy", mmap_mode="r"),
+                       n_docs, digest)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+_lexical_indexes = {}
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_index(df):
+    """Shared BM25 index for the dataset df came from, loaded or built from the full frame.
+
+    A filtered view cannot build it (it lacks the other rows' text), so it gets
+    the index only once the full frame has loaded it, and None before that.
+    """
+    source = df.attrs.get("index_base", df.attrs.get("source"))
+    n_rows = df.attrs.get("rows", len(df))
+    key = (source, n_rows)
+    with _lexical_lock:
+        if key in _lexical_indexes:
+            return _lexical_indexes[key]
+        if len(df) != n_rows:
+            return None
+        docs = _documents(df)
+        digest = _text_digest(docs)
+        index = BM25Index.load(source, n_rows, digest) if source else None
+        if index is None:
+            index = BM25Index.build(docs, digest)
+            if source:
+                try:
+                    index.save(source)
+                except OSError:
+                    pass
+        _lexical_indexes[key] = index
+        return index
+
+
+if __name__ == "__main__":
+    # python lexical_index.py path/to/arabic_personalities.csv
+    from main import load_csv, collapse_entities
+    df = collapse_entities(load_csv(sys.argv[1]))
+    index = get_lexical_index(df)
+    print(f"{len(index.vocab)} terms, {len(index.docs)} postings over {index.n_docs} rows "
+          f"-> {df.attrs['index_base']}{FILE_SUFFIX}-*.npy")
@@ -2,23 +2,100 @@ import os
 # تعطيل كل الـGPU واستخدام CPU فقط
 os.environ["CUDA_VISIBLE_DEVICES"] = ""
 
+import sys
+import threading
+import numpy as np
 import pandas as pd
 from math import log2
-from sentence_transformers import SentenceTransformer, util
+from candidates import CandidateIndex, pack_flags
+from dataset_cache import CHUNK_ROWS, get_text_store, load_cache, row_with_text, save_cache, text_column, with_text
+from embedding_index import HintBatcher, HintCache, get_embedding_index
+from ann_index import ANN_THRESHOLD, get_ann_index
+from lexical_index import get_lexical_index
+from question_tree import ANSWER_CODES, get_question_tree
+from instrumentation import NULL_METRICS
+from planner import get_planner
 
 # ==============================
 # Load CSV
 # ==============================
+EXPECTED_COLUMNS = ['name','gender','country','occupation','birth_date','death_date','image_url','description']
+
+def _read_chunks(path):
+    for chunk in pd.read_csv(path, dtype=str, chunksize=CHUNK_ROWS):
+        chunk = chunk.fillna("")
+        for col in EXPECTED_COLUMNS:
+            if col not in chunk.columns:
+                chunk[col] = ""
+        chunk['alive'] = chunk['death_date'].str.strip() == ""
+        yield chunk
+
 def load_csv(path):
-    df = pd.read_csv(path, dtype=str).fillna("")
-    expected = ['name','gender','country','occupation','birth_date','death_date','image_url','description']
-    for col in expected:
-        if col not in df.columns:
-            df[col] = ""
-    df['alive'] = df['death_date'].astype(str).str.strip() == ""
+    # the CSV is streamed once into the columnar cache written next to it; later launches read the cache.
+    # descriptions and image urls stay on disk (dataset_cache.TextStore) and are read per row on demand
+    df = load_cache(path)
+    if df is None and save_cache(path, _read_chunks(path)):
+        df = load_cache(path)
+    if df is None:
+        # cache not writable: keep everything in memory
+        df = pd.concat(_read_chunks(path), ignore_index=True)
     df['score'] = 1.0
+    # row ids of this frame key the persisted embedding index
+    df.attrs['source'] = path
+    df.attrs['rows'] = len(df)
     return df
 
+# The crawl yields one row per (person, occupation, country) binding, keyed by
+# the person's Wikidata id; occupation and country become tuples of distinct
+# values.  Rows without an id (CSVs written before the crawler kept it) fall
+# back to the name as key, which merges people who share a name, so birth and
+# death years are kept as tuples too: a year answer only drops an entity when
+# none of its years fits it (CandidateIndex.answer_bits).
+MULTI_VALUED = ['country', 'occupation', 'birth_date', 'death_date']
+
+def _distinct(values):
+    return tuple(dict.fromkeys(v for v in values if str(v).strip()))
+
+def _first_nonempty(values):
+    return next((v for v in values if str(v).strip()), "")
+
+def _entity_keys(df):
+    names = df['name'].astype(str)
+    if 'wikidata_id' not in df.columns:
+        return names
+    ids = df['wikidata_id'].astype(str).str.strip()
+    return ids.where(ids != "", "name:" + names)
+
+def collapse_entities(df):
+    agg = {col: 'first' for col in df.columns}
+    for col in MULTI_VALUED:
+        agg[col] = _distinct
+    if 'image_url' in df.columns:
+        agg['image_url'] = _first_nonempty
+    else:
+        # text kept in the store: refs are row order, so the smallest ref with a non-empty url is the first one
+        refs = df['image_url_ref'].to_numpy()
+        empty = get_text_store(df.attrs['text'], 'image_url').lengths()[refs] == 0
+        df = df.assign(image_url_ref=np.where(empty, len(df), refs))
+        agg['image_url_ref'] = 'min'
+    out = df.groupby(_entity_keys(df).to_numpy(), sort=False).agg(agg).reset_index(drop=True)
+    if 'image_url_ref' in out.columns:
+        out.loc[out['image_url_ref'] >= len(df), 'image_url_ref'] = -1
+    out['alive'] = out['alive'].astype(bool)
+    if 'text' in df.attrs:
+        out.attrs['text'] = df.attrs['text']
+    out.attrs['source'] = df.attrs.get('source')
+    out.attrs['rows'] = len(out)
+    # entity row ids differ from CSV row ids, so they get their own embedding files
+    if out.attrs['source']:
+        out.attrs['index_base'] = out.attrs['source'] + '.entities'
+    return out
+
+def display_value(value):
+    if isinstance(value, tuple):
+        return ", ".join(str(v) for v in value)
+    return value
+
 # ==============================
 # Input handling
 # ==============================
@@ -37,136 +114,259 @@ def yes_no_idk(prompt):
 # ==============================
 # Entropy & Question Selection
 # ==============================
-def _entropy(counts):
-    total = sum(counts)
-    if total == 0:
-        return 0.0
-    ent = 0.0
-    for c in counts:
-        if c <= 0:
-            continue
-        p = c / total
-        ent -= p * log2(p)
-    return ent
-
-def _best_question(possible, columns, asked):
-    best = None
-    best_gain = 0.0
-    total = len(possible)
+def _split_gains(yes, no, total):
+    """Expected entropy drop (bits) of yes/no splits of total equally likely rows.
+
+    A row consistent with both answers (a merged name with years on both sides
+    of a threshold) is in yes and in no, so yes + no can exceed total.
+    """
+    yes = np.asarray(yes, dtype=float)
+    no = np.asarray(no, dtype=float)
+    return log2(total) - (yes * np.log2(yes) + no * np.log2(no)) / (yes + no)
+
+def _best_question_codes(index, mask, columns, asked):
+    """Highest entropy-gain question, from per-column bincounts over the candidate mask."""
+    scored = _question_gains(index, mask, columns, asked)
+    if scored is None:
+        return None
+    keys, yes_counts, gains, total = scored
+    i = int(np.argmax(gains))
+    if gains[i] <= 0.0:
+        return None
+    return _key_question(index, keys[i]) + (float(gains[i]),)
+
+def _question_gains(index, mask, columns, asked):
+    """Every askable question over the candidate mask: (keys, yes counts, entropy gains, total).
+
+    Set-valued columns (see collapse_entities) count an entity once for each value it holds,
+    i.e. "is the character's occupation X?" means "is X one of its occupations?".
+    Year columns (index.years) add one "before <year>" question per threshold, all
+    counted by one cumulative sum.  Only questions where both answers drop some
+    candidate are kept.
+    """
+    rows = index.rows(mask)
+    total = len(rows)
     if total <= 1:
         return None
 
+    keys = []
+    yes_counts = []
+    no_counts = []
+    flags = None
     for col in columns:
+        if col in index.years:
+            if flags is None:
+                flags = index.flags(mask)
+            yes, no = index.range_counts(col, flags)
+            keep = (yes > 0) & (yes < total) & (no > 0) & (no < total)
+            asked_years = [v for c, v in asked if c == col]
+            if asked_years:
+                keep &= ~np.isin(index.thresholds[col].astype(str), asked_years)
+            keys.extend((col, j) for j in np.flatnonzero(keep))
+            yes_counts.append(yes[keep])
+            no_counts.append(no[keep])
+            continue
         if col == 'alive':
             if ('alive', None) in asked:
                 continue
-            yes_count = int((possible['alive'] == True).sum())
-            no_count = total - yes_count
-            parent_entropy = _entropy([yes_count, no_count])
-            e_yes = _entropy([yes_count, 0])
-            e_no = _entropy([no_count, 0])
-            expected = (yes_count / total) * e_yes + (no_count / total) * e_no
-            gain = parent_entropy - expected
-            if gain > best_gain:
-                best_gain = gain
-                best = (col, None, gain)
+            yes = index.count(mask & index.bits_for('alive', None))
+            if 0 < yes < total:
+                keys.append(('alive', None))
+                yes_counts.append(np.array([yes]))
+                no_counts.append(np.array([total - yes]))
             continue
 
-        vals = [v for v in possible[col].dropna().unique() if str(v).strip()]
-        for val in vals:
-            key = (col, str(val))
-            if key in asked:
-                continue
-            yes_count = int((possible[col] == val).sum())
-            no_count = total - yes_count
-            parent_entropy = _entropy([yes_count, no_count])
-            e_yes = _entropy([yes_count, 0])
-            e_no = _entropy([no_count, 0])
-            expected = (yes_count / total) * e_yes + (no_count / total) * e_no
-            gain = parent_entropy - expected
-            if gain > best_gain:
-                best_gain = gain
-                best = (col, val, gain)
-    return best
+        present, counts = index.value_counts(col, rows)
+        keep = ~index.blank[col][present]
+        asked_codes = [index.code_of(col, v) for c, v in asked if c == col]
+        if asked_codes:
+            keep &= ~np.isin(present, [c for c in asked_codes if c is not None])
+        keep &= counts < total
+        keys.extend((col, code) for code in present[keep])
+        yes_counts.append(counts[keep])
+        no_counts.append(total - counts[keep])
+
+    if not keys:
+        return None
+    yes_counts = np.concatenate(yes_counts)
+    gains = _split_gains(yes_counts, np.concatenate(no_counts), total)
+    return keys, yes_counts, gains, total
+
+RANGE_QUESTIONS = {
+    'birth_date': "Was the character born before {}?",
+    'death_date': "Did the character die before {}?",
+}
+
+def question_text(col, val):
+    if col == "alive":
+        return "Is the character still alive?"
+    if col in RANGE_QUESTIONS:
+        return RANGE_QUESTIONS[col].format(val)
+    return f"Is the character's {col} '{val}'?"
+
+def _key_question(index, key):
+    """(col, val) for a selector key: (col, value code), or (col, threshold position) for years."""
+    col, code = key
+    if col == 'alive':
+        return (col, None)
+    if col in index.years:
+        return (col, int(index.thresholds[col][code]))
+    return (col, index.values[col][code])
 
 # ==============================
 # Core System (combined filtering + scoring)
 # ==============================
-def akinator_probabilistic(df):
-    possible = df.copy()
+def akinator_probabilistic(df, bayesian=False):
+    engine = akinator_probabilistic_step(df, bayesian)
     print("Welcome to the Expert System! Answer yes / no / idk only.\n")
 
-    columns_to_probe = ['gender', 'country', 'occupation', 'alive']
-    asked = set()
-
     while True:
-        if len(possible) == 0:
+        if engine.count() == 0:
             print("No candidates remain.")
             return
 
-        best_guess = possible.sort_values('score', ascending=False).iloc[0]
-        confidence = best_guess['score'] / possible['score'].mean()
+        best_guess = engine.best_guess()
+        # best_guess scores are already relative to the running mean of the live scores
+        confidence = best_guess['score']
 
         if confidence >= 2.0 and best_guess['score'] > 1.5:
             ans = yes_no_idk(f"Are you thinking of {best_guess['name']}?")
             if ans == 'yes':
                 print("\n🎯 Great! I guessed it right!")
-                print_person(best_guess)
+                print_person(engine.person(best_guess))
                 return
             else:
-                possible.loc[possible['name'] == best_guess['name'], 'score'] *= 0.5
-                possible['score'] = possible['score'] / possible['score'].mean()
+                engine.penalize(best_guess['name'])
 
-        if len(possible) <= 3:
-            goto_final(possible)
+        if engine.count() <= 3:
+            goto_final(engine.possible)
             return
 
-        best = _best_question(possible, columns_to_probe, asked)
-        if not best:
-            goto_final(possible)
+        nxt = engine.next_question()
+        if not nxt:
+            goto_final(engine.possible)
             return
 
-        col, val, gain = best
-
-        if col == 'alive':
-            q = "Is the character still alive?"
-        else:
-            q = f"Is the character's {col} '{val}'?"
-
+        col, val, q = nxt
         ans = yes_no_idk(q)
-
-        if col == 'alive':
-            asked.add(('alive', None))
-        else:
-            asked.add((col, str(val)))
-
-        if ans == 'idk':
-            continue
-
-        if col == 'alive':
-            want_alive = (ans == 'yes')
-            possible = possible[possible['alive'] == want_alive].copy()
-            possible['score'] *= 1.2
-        else:
-            if ans == 'yes':
-                kept = possible[possible[col] == val].copy()
-                if kept.empty:
-                    possible.loc[possible[col] == val, 'score'] *= 1.2
-                    possible.loc[possible[col] != val, 'score'] *= 0.8
-                else:
-                    kept['score'] *= 1.2
-                    possible = kept
-            else:
-                possible = possible[possible[col] != val].copy()
-                possible['score'] *= 1.1
-
-        if len(possible) > 0:
-            possible['score'] = possible['score'] / possible['score'].mean()
+        engine.apply_answer(col, val, ans)
 
 # ==============================
 # Final Stage with NLP-based description matching (CPU-only)
 # ==============================
-nlp_model = SentenceTransformer('all-MiniLM-L6-v2')  # CPU
+# torch / sentence_transformers are only imported on the loader thread, so the
+# question phase never waits for them; get_nlp_model() blocks only if a hint
+# arrives before loading has finished.
+MODEL_NAME = 'all-MiniLM-L6-v2'  # CPU
+ANN_TOP_K = 50
+LEXICAL_THRESHOLD = 200   # candidate sets at least this large go through the BM25 prefilter
+LEXICAL_TOP_K = 100       # shortlist re-ranked with embeddings
+
+_nlp_model = None
+_nlp_model_error = None
+_nlp_model_ready = threading.Event()
+_nlp_model_lock = threading.Lock()
+_nlp_model_thread = None
+
+def _load_nlp_model():
+    global _nlp_model, _nlp_model_error
+    try:
+        from sentence_transformers import SentenceTransformer
+        _nlp_model = SentenceTransformer(MODEL_NAME)
+    except Exception as e:
+        _nlp_model_error = e
+    finally:
+        _nlp_model_ready.set()
+
+def start_model_loading():
+    global _nlp_model_thread
+    with _nlp_model_lock:
+        if _nlp_model_thread is None:
+            _nlp_model_thread = threading.Thread(target=_load_nlp_model, name="nlp-model-loader", daemon=True)
+            _nlp_model_thread.start()
+
+def get_nlp_model():
+    start_model_loading()
+    _nlp_model_ready.wait()
+    if _nlp_model_error is not None:
+        raise _nlp_model_error
+    return _nlp_model
+
+# hints from concurrent callers (CLI, GUI workers, server sessions) share encode batches
+# and one LRU of hint embeddings, so repeated or popular hints skip the model entirely
+hint_cache = HintCache()
+_hint_batcher = HintBatcher(get_nlp_model, cache=hint_cache)
+
+def encode_hint(hint):
+    return _hint_batcher.encode(hint)
+
+def _rank(df, rows, texts, hint, metrics=NULL_METRICS):
+    """Scores of rows (embedding row ids) against the hint; texts(sel) gives the descriptions of rows[sel]."""
+    index = get_embedding_index(df)
+    if metrics.enabled:
+        metrics.gauge("hint_candidates", len(rows))
+    lexical = get_lexical_index(df) if len(rows) >= LEXICAL_THRESHOLD else None
+    if lexical is not None:
+        with metrics.stage("lexical_prefilter"):
+            short = lexical.shortlist(hint, rows, LEXICAL_TOP_K)
+        # hints with no indexed token fall through to the semantic paths below
+        if len(short):
+            metrics.incr("lexical_shortlists")
+            scores = np.full(len(rows), -np.inf, dtype=np.float32)
+            scores[short] = _rank_semantic(index, rows[short], texts(short), hint, metrics)
+            return scores
+    _encode_rows(index, rows, texts, metrics)
+    # looked up after ensure, so the IVF index is validated against the hashes ensure may just have changed
+    ivf = get_ann_index(index) if len(rows) >= ANN_THRESHOLD else None
+    if ivf is None:
+        return _rank_semantic(index, rows, None, hint, metrics)
+    hint_embedding = _encode_hint(hint, metrics)
+    # large candidate sets: only the IVF shortlist is scored, everything else ranks last
+    allowed = np.zeros(index.n_rows, dtype=bool)
+    allowed[rows] = True
+    with metrics.stage("ann_search"):
+        top, top_scores = ivf.search(hint_embedding, index, k=ANN_TOP_K, allowed=allowed)
+    position = np.empty(index.n_rows, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    scores = np.full(len(rows), -np.inf, dtype=np.float32)
+    scores[position[top]] = top_scores
+    return scores
+
+def _encode_hint(hint, metrics):
+    with metrics.stage("encode_hint"):
+        hint_embedding = encode_hint(hint)
+    if metrics.enabled:
+        metrics.gauge("hint_cache_hits", hint_cache.hits)
+        metrics.gauge("hint_cache_misses", hint_cache.misses)
+    return hint_embedding
+
+def _encode_rows(index, rows, texts, metrics):
+    with metrics.stage("encode_descriptions"):
+        encoded = index.ensure(rows, texts, get_nlp_model())
+    if encoded:
+        metrics.incr("descriptions_encoded", encoded)
+
+def _rank_semantic(index, rows, texts, hint, metrics):
+    # exact cosine scores of rows, first encoding any description not yet in the index (texts=None: already done)
+    if texts is not None:
+        _encode_rows(index, rows, texts, metrics)
+    hint_embedding = _encode_hint(hint, metrics)
+    with metrics.stage("cos_sim"):
+        return index.scores(hint_embedding, rows)
+
+def rank_rows(df, rows, hint, metrics=NULL_METRICS):
+    """Cosine similarity of the hint against the (cached) description embeddings of rows (positions in df).
+
+    Large candidate sets are first cut to a BM25 shortlist (lexical_index.py); rows outside it score -inf.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    return _rank(df, rows, lambda sel: text_column(df, 'description', rows[sel]), hint, metrics)
+
+def rank_by_hint(candidates, hint, metrics=NULL_METRICS):
+    """Same as rank_rows for a filtered view, whose index labels are the row ids."""
+    positions = np.arange(len(candidates))
+    return _rank(candidates, candidates.index.to_numpy(),
+                 lambda sel: text_column(candidates, 'description', positions[sel]), hint, metrics)
 
 def goto_final(possible, previous_hint=None, excluded_names=None):
     if excluded_names is None:
@@ -176,7 +376,7 @@ def goto_final(possible, previous_hint=None, excluded_names=None):
         return
     if len(possible) == 1:
         print("Found one candidate:")
-        print_person(possible.iloc[0])
+        print_person(row_with_text(possible, 0))
         confirm_final(possible.iloc[0], possible, previous_hint, excluded_names)
         return
 
@@ -191,16 +391,14 @@ def goto_final(possible, previous_hint=None, excluded_names=None):
         if not hint or hint in ['idk','i dont know','i don\'t know']:
             print("Remaining candidates:")
             for _, r in candidates.sort_values('score', ascending=False).iterrows():
-                print("-", r['name'], "|", r['occupation'], "|", "Alive" if r['alive'] else "Deceased")
+                print("-", r['name'], "|", display_value(r['occupation']), "|", "Alive" if r['alive'] else "Deceased")
             return
 
         combined_hint = (previous_hint + " " + hint) if previous_hint else hint
 
-        hint_embedding = nlp_model.encode(combined_hint, convert_to_tensor=True)
-        desc_embeddings = nlp_model.encode(candidates['description'].tolist(), convert_to_tensor=True)
-        cos_scores = util.cos_sim(hint_embedding, desc_embeddings)[0]
-        best_idx = cos_scores.argmax().item()
-        best_row = candidates.iloc[best_idx]
+        cos_scores = rank_by_hint(candidates, combined_hint)
+        best_idx = int(cos_scores.argmax())
+        best_row = row_with_text(candidates, best_idx)
 
         print("Best match based on your hint (using NLP similarity on CPU):")
         print_person(best_row)
@@ -232,10 +430,10 @@ def print_person(row):
     print("------------------------")
     print("Name:", row['name'])
     print("Gender:", row['gender'])
-    print("Country:", row['country'])
-    print("Occupation:", row['occupation'])
-    print("Birth Year:", row['birth_date'])
-    print("Death Year:", row['death_date'])
+    print("Country:", display_value(row['country']))
+    print("Occupation:", display_value(row['occupation']))
+    print("Birth Year:", display_value(row['birth_date']))
+    print("Death Year:", display_value(row['death_date']))
     print("Alive:", "Yes" if row['alive'] else "No")
     if row['description']:
         print("Description:", row['description'][:300])
@@ -248,41 +446,145 @@ def print_person(row):
 # ==============================
 
 class AkinatorEngine:
-    def __init__(self, df):
+    def __init__(self, df, index=None, tree=None, metrics=None, lookahead=0):
+        # df and its CandidateIndex are shared read-only; a game only owns its mask and scores
         self.df = df
-        self.possible = df.copy()
-        self.columns_to_probe = ['gender','country','occupation','alive']
+        # per-stage timers/counters (instrumentation.py); off unless a Metrics is passed
+        self.metrics = metrics or NULL_METRICS
+        self.index = index if index is not None else CandidateIndex(df)
+        self.mask = self.index.full_mask()
+        # shared with df until the first penalty (copy on write)
+        self.scores = df['score'].to_numpy(dtype=float)
+        self._own_scores = False
+        # running sum/count of the live scores, updated as candidates are removed
+        self._live_sum = float(self.scores.sum())
+        self._live_count = self.index.n
+        self.columns_to_probe = ['gender','country','occupation','alive','birth_date','death_date']
         self.asked = set()
+        self._possible = None
+        # lookahead > 1 plans that many questions ahead (planner.py) instead of greedy selection
+        self.planner = get_planner(self.index, self.columns_to_probe, lookahead) if lookahead > 1 else None
+        # precomputed opening questions (question_tree.py, greedy); tree=False turns them off
+        if tree is None and self.planner is None:
+            tree = get_question_tree(df, self.index, self.columns_to_probe)
+        self.tree = tree or None
+        self.path = "" if self.tree is not None else None
+
+    @property
+    def possible(self):
+        # DataFrame of live candidates, built only when rows are actually needed
+        if self._possible is None:
+            with self.metrics.stage("renormalize"):
+                rows = self.index.rows(self.mask)
+                possible = self.df.iloc[rows].copy()
+                possible['score'] = self.scores[rows] / self.mean_score()
+                self._possible = possible
+        return self._possible
+
+    def count(self):
+        return self._live_count
+
+    def mean_score(self):
+        return self._live_sum / self._live_count if self._live_count else 1.0
+
+    def rows(self):
+        # positions of the live candidates in df
+        return self.index.rows(self.mask)
 
     def next_question(self):
-        from main import _best_question
-        best = _best_question(self.possible, self.columns_to_probe, self.asked)
+        with self.metrics.stage("next_question"):
+            if self.tree is not None and self.path in self.tree:
+                self.metrics.incr("question_tree_hits")
+                best = self.tree.question(self.path)
+            elif self.planner is not None:
+                best = self.planner.choose(self.mask, self.asked, self.metrics)
+            else:
+                best = _best_question_codes(self.index, self.mask, self.columns_to_probe, self.asked)
         if not best:
             return None
-        col, val, gain = best
-        if col == "alive":
-            q = "Is the character still alive?"
-        else:
-            q = f"Is the character's {col} '{val}'?"
-        return (col, val, q)
+        col, val = best[0], best[1]
+        return (col, val, question_text(col, val))
 
     def apply_answer(self, col, val, ans):
-        if col == 'alive':
-            want_alive = (ans == 'yes')
-            self.possible = self.possible[self.possible['alive'] == want_alive].copy()
-        else:
-            if ans == 'yes':
-                self.possible = self.possible[self.possible[col] == val].copy()
+        with self.metrics.stage("apply_answer"):
+            self._apply_answer(col, val, ans)
+        if self.metrics.enabled:
+            self.metrics.incr("answers_" + ans)
+            self.metrics.gauge("candidates", self.count())
+
+    def _apply_answer(self, col, val, ans):
+        if self.tree is not None and self.path in self.tree:
+            # stay on the tree only while answering the question it asked
+            expected = self.tree.question(self.path)
+            if expected and expected[0] == col and (col == 'alive' or str(expected[1]) == str(val)):
+                self.path += ANSWER_CODES[ans]
             else:
-                self.possible = self.possible[self.possible[col] != val].copy()
+                self.path = None
+        self.asked.add((col, None if col == 'alive' else str(val)))
+        if ans == 'idk':
+            return
+        keep = self.index.answer_bits(col, val, ans == 'yes')
+        removed = self.index.rows(self.mask & ~keep)
+        if len(removed):
+            self._live_count -= len(removed)
+            self._live_sum -= float(self.scores[removed].sum())
+            if not self._live_count:
+                self._live_sum = 0.0
+        np.bitwise_and(self.mask, keep, out=self.mask)
+        self._possible = None
+
+    def penalize(self, name):
+        self.metrics.incr("penalties")
+        rows = self.index.rows(self.mask)
+        rows = rows[self.df['name'].to_numpy()[rows] == name]
+        if not self._own_scores:
+            self.scores = self.scores.copy()
+            self._own_scores = True
+        penalty = self.scores[rows] * 0.5
+        self.scores[rows] -= penalty
+        self._live_sum -= float(penalty.sum())
+        self._possible = None
+
+    def top_rows(self, k, exclude=()):
+        """Positions of the k best-scoring live candidates, best first (ties keep row order).
+
+        Selects with np.partition instead of sorting every candidate.
+        """
+        rows = self.rows()
+        if exclude:
+            rows = rows[~np.isin(self.df['name'].to_numpy()[rows], list(exclude))]
+        scores = self.scores[rows]
+        if k < len(rows):
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:k - len(above)]
+            pick = np.concatenate([above, ties])
+        else:
+            pick = np.arange(len(rows))
+        return rows[pick[np.lexsort((pick, -scores[pick]))]]
 
-        if len(self.possible) > 0:
-            self.possible['score'] = self.possible['score'] / self.possible['score'].mean()
+    def top_k(self, k, exclude=()):
+        """DataFrame of the k best candidates with scores relative to the live mean."""
+        rows = self.top_rows(k, exclude)
+        top = with_text(self.df.iloc[rows])
+        top['score'] = self.scores[rows] / self.mean_score()
+        return top
 
     def best_guess(self):
-        if len(self.possible) == 0:
+        """{'row', 'name', 'score'} of the top candidate, read from the arrays; no text is loaded."""
+        if self.count() == 0:
             return None
-        return self.possible.sort_values('score', ascending=False).iloc[0]
+        with self.metrics.stage("best_guess"):
+            rows = self.rows()
+            best = int(rows[int(np.argmax(self.scores[rows]))])
+            return {'row': best, 'name': self.df['name'].iat[best],
+                    'score': float(self.scores[best] / self.mean_score())}
+
+    def person(self, guess):
+        """Full row of a best_guess, text columns included, for showing it."""
+        row = row_with_text(self.df, guess['row'])
+        row['score'] = guess['score']
+        return row
 
     def ask(self):
         q = self.next_question()
@@ -290,7 +592,7 @@ class AkinatorEngine:
             return None
         col, val, q_text = q
         self._last_question = (col, val)
-        remaining = len(self.possible)
+        remaining = self.count()
         return (q_text, remaining)
 
     def answer(self, user_answer):
@@ -298,19 +600,163 @@ class AkinatorEngine:
         if not hasattr(self, '_last_question') or self._last_question is None:
             return False
         col, val = self._last_question
-        # if user answered idk, do not filter
-        if user_answer != 'idk':
-            self.apply_answer(col, val, user_answer)
+        # an idk answer only marks the question as asked
+        self.apply_answer(col, val, user_answer)
         # clear last question
         self._last_question = None
         # consider finished when 0 or 1 candidates remain
-        return len(self.possible) <= 1
+        return self.count() <= 1
 
     def get_best(self):
         return self.best_guess()
 
-def akinator_probabilistic_step(df):
-    return AkinatorEngine(df)
+# ==============================
+# Bayesian mode (soft answers, nothing is ever dropped)
+# ==============================
+# Each entity keeps a log-probability.  An answer multiplies in a likelihood:
+# 1 - error_rate if the entity agrees with it, error_rate if it does not, so
+# a single wrong answer only costs the target a constant factor.  The "live"
+# candidates (mask, count(), rows(), ...) are the credible set: the fewest
+# most probable entities holding credible_mass of the posterior, so the game
+# only narrows down once the answers agree on a few people.
+
+BAYES_ERROR_RATE = 0.05
+BAYES_CREDIBLE_MASS = 0.5
+BAYES_MIN_GAIN = 1e-3   # bits; below this no question is worth asking
+
+def _binary_entropy(p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+def _best_question_bayes(index, weights, live, columns, asked, error_rate):
+    """Question with the lowest expected posterior entropy, over all values of all columns at once.
+
+    With a symmetric error rate e, P(yes) = e + (1 - 2e) * w where w is the
+    posterior mass holding the value, and the expected posterior entropy is
+    H(prior) - (H_b(P(yes)) - H_b(e)); so one weighted bincount per column
+    scores every candidate question.  A merged name with years on both sides of
+    a threshold agrees with either answer: its mass b counts as half yes and
+    adds b * (1 - H_b(e)) of answer entropy the question cannot explain.
+    Nothing is asked once no question divides the live rows.  Returns
+    (col, val, expected entropy).
+    """
+    total = weights.sum()
+    if total <= 0:
+        return None
+    p = weights / total
+    nz = p[p > 0]
+    prior_entropy = float(-(nz * np.log2(nz)).sum())
+    n_live = int(live.sum())
+    keys = []
+    masses = []
+    both = []
+    splits = []
+    for col in columns:
+        if col in index.years:
+            w, w_no = index.range_counts(col, p)
+            holders, no_holders = index.range_counts(col, live)
+            keep = w > 0
+            asked_years = [v for c, v in asked if c == col]
+            if asked_years:
+                keep &= ~np.isin(index.thresholds[col].astype(str), asked_years)
+            positions = np.flatnonzero(keep)
+            overlap = np.clip(w[positions] + w_no[positions] - 1.0, 0.0, 1.0)
+            keys.extend((col, j) for j in positions)
+            masses.append(w[positions] - overlap / 2)
+            both.append(overlap)
+            splits.append((holders[positions] > 0) & (holders[positions] < n_live)
+                          & (no_holders[positions] > 0) & (no_holders[positions] < n_live))
+            continue
+        if col == 'alive':
+            if ('alive', None) in asked:
+                continue
+            alive = index.flags(index.bits_for('alive', None))
+            keys.append(('alive', None))
+            masses.append(np.array([p[alive].sum()]))
+            both.append(np.zeros(1))
+            splits.append(np.array([0 < alive[live].sum() < n_live]))
+            continue
+        w = index.value_weights(col, p)
+        holders = index.value_weights(col, live.astype(float))
+        keep = ~index.blank[col] & (w > 0)
+        for c, v in asked:
+            code = index.code_of(col, v) if c == col else None
+            if code is not None:
+                keep[code] = False
+        codes = np.flatnonzero(keep)
+        keys.extend((col, code) for code in codes)
+        masses.append(w[codes])
+        both.append(np.zeros(len(codes)))
+        splits.append((holders[codes] > 0) & (holders[codes] < n_live))
+    if not keys:
+        return None
+    splits = np.concatenate(splits)
+    if not splits.any():
+        return None
+    masses = np.concatenate(masses)
+    both = np.concatenate(both)
+    noise = _binary_entropy(error_rate)
+    gains = (_binary_entropy(error_rate + (1 - 2 * error_rate) * masses) - noise) - both * (1.0 - noise)
+    i = int(np.argmax(gains))
+    if gains[i] < BAYES_MIN_GAIN:
+        return None
+    return _key_question(index, keys[i]) + (prior_entropy - float(gains[i]),)
+
+class BayesianAkinatorEngine(AkinatorEngine):
+    def __init__(self, df, index=None, metrics=None, error_rate=BAYES_ERROR_RATE, credible_mass=BAYES_CREDIBLE_MASS):
+        # the precomputed question tree assumes hard filtering, so it is not used here
+        super().__init__(df, index=index, tree=False, metrics=metrics)
+        self.error_rate = error_rate
+        self.log_yes = np.log(1 - error_rate)
+        self.log_no = np.log(error_rate)
+        self.credible_mass = credible_mass
+        with np.errstate(divide='ignore'):
+            self.logp = np.log(self.scores)
+        self._refresh()
+
+    def _refresh(self):
+        # live set, scores and running sums all follow from the log-probabilities
+        self.scores = np.exp(self.logp - self.logp.max())
+        ordered = np.sort(self.scores)[::-1]
+        cut = int(np.searchsorted(np.cumsum(ordered), self.credible_mass * ordered.sum()))
+        live = self.scores >= ordered[min(cut, len(ordered) - 1)]
+        self.mask = pack_flags(live, self.index.words)
+        self._own_scores = True
+        self._live_count = int(live.sum())
+        self._live_sum = float(self.scores[live].sum())
+        self._possible = None
+
+    def posterior(self):
+        """Normalized probability of every entity (not only the live ones)."""
+        return self.scores / self.scores.sum()
+
+    def next_question(self):
+        with self.metrics.stage("next_question"):
+            best = _best_question_bayes(self.index, self.scores, self.index.flags(self.mask),
+                                        self.columns_to_probe, self.asked, self.error_rate)
+        if not best:
+            return None
+        col, val = best[0], best[1]
+        return (col, val, question_text(col, val))
+
+    def _apply_answer(self, col, val, ans):
+        self.asked.add((col, None if col == 'alive' else str(val)))
+        if ans == 'idk':
+            return
+        agrees = self.index.flags(self.index.answer_bits(col, val, ans == 'yes'))
+        self.logp += np.where(agrees, self.log_yes, self.log_no)
+        self._refresh()
+
+    def penalize(self, name):
+        self.metrics.incr("penalties")
+        self.logp[self.df['name'].to_numpy() == name] += np.log(0.5)
+        self._refresh()
+
+def akinator_probabilistic_step(df, bayesian=False, lookahead=0):
+    if bayesian:
+        return BayesianAkinatorEngine(df)
+    return AkinatorEngine(df, lookahead=lookahead)
 if __name__ == "__main__":
-    df = load_csv("/mnt/youssef/python_projects/akinator/data/arabic_personalities.csv")
-    akinator_probabilistic(df)
+    start_model_loading()
+    df = collapse_entities(load_csv("/mnt/youssef/python_projects/akinator/data/arabic_personalities.csv"))
+    akinator_probabilistic(df, bayesian="--bayesian" in sys.argv)
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+import weakref
+from math import log2
+
+import numpy as np
+
+# ==============================
+# Lookahead question planning
+# ==============================
+# The greedy selector maximises one-step entropy gain.  The planner instead
+# looks depth questions ahead over the beam best greedy candidates and picks
+# the question with the lowest expected number of questions left, estimating
+# log2(n / final) for the candidate sets at the horizon.  Subproblems are
+# memoized by a hash of their candidate mask plus the questions already asked
+# (which a subproblem may not ask again; an "I don't know" answer grows the
+# asked set without narrowing the mask), so transpositions (the same questions
+# answered in a different order) and later turns of other games reuse them.
+# Each turn has a time budget; when it runs out the planner returns the
+# greedy question instead.
+
+DEFAULT_DEPTH = 2
+DEFAULT_BEAM = 6
+DEFAULT_BUDGET = 0.05     # seconds per turn
+FINAL_CANDIDATES = 3      # the game stops asking at this many candidates
+MEMO_LIMIT = 200_000
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _mask_key(mask):
+    return hashlib.blake2b(mask.tobytes(), digest_size=16).digest()
+
+
+class LookaheadPlanner:
+    def __init__(self, index, columns, depth=DEFAULT_DEPTH, beam=DEFAULT_BEAM, budget=DEFAULT_BUDGET,
+                 final=FINAL_CANDIDATES):
+        self.index = index
+        self.columns = list(columns)
+        self.depth = depth
+        self.beam = beam
+        self.budget = budget
+        self.final = final
+        self._memo = {}   # (mask hash, asked, depth) -> expected questions left
+
+    def _leaf(self, n):
+        return max(0.0, log2(n / self.final))
+
+    def choose(self, mask, asked, metrics=None):
+        """(col, val, expected questions left) for the candidate mask, or None if nothing splits it."""
+        from main import _best_question_codes, _key_question, _question_gains
+        scored = _question_gains(self.index, mask, self.columns, asked)
+        if scored is None:
+            return None
+        keys, yes_counts, gains, total = scored
+        order = np.argsort(-gains, kind="stable")[:self.beam]
+        if gains[order[0]] <= 0.0:
+            return None
+        if total <= self.final or self.depth <= 1:
+            return _key_question(self.index, keys[order[0]]) + (float(gains[order[0]]),)
+
+        deadline = time.perf_counter() + self.budget
+        try:
+            best, best_cost = None, None
+            for i in order:
+                if gains[i] <= 0.0:
+                    break
+                cost = self._split_cost(mask, keys[i], int(yes_counts[i]), total, self.depth - 1, asked, deadline)
+                if best_cost is None or cost < best_cost - 1e-12:
+                    best, best_cost = i, cost
+        except _OutOfTime:
+            if metrics is not None:
+                metrics.incr("planner_fallbacks")
+            return _best_question_codes(self.index, mask, self.columns, asked)
+        if len(self._memo) > MEMO_LIMIT:
+            self._memo.clear()
+        return _key_question(self.index, keys[best]) + (best_cost,)
+
+    def _split_cost(self, mask, key, yes, total, depth, asked, deadline):
+        from main import _key_question
+        col, val = _key_question(self.index, key)
+        asked = asked | {(col, None if col == 'alive' else str(val))}
+        # a name holding several years can fit both answers, so no is counted rather than total - yes
+        no_mask = mask & self.index.answer_bits(col, val, False)
+        no = self.index.count(no_mask)
+        return 1.0 + (yes * self._cost(mask & self.index.answer_bits(col, val, True), yes, depth, asked, deadline)
+                      + no * self._cost(no_mask, no, depth, asked, deadline)) / (yes + no)
+
+    def _cost(self, mask, n, depth, asked, deadline):
+        """Expected questions left for a candidate set of n rows, searching depth more questions."""
+        if n <= self.final:
+            return 0.0
+        if depth == 0:
+            return self._leaf(n)
+        memo_key = (_mask_key(mask), frozenset(asked), depth)
+        cached = self._memo.get(memo_key)
+        if cached is not None:
+            return cached
+        if time.perf_counter() > deadline:
+            raise _OutOfTime()
+
+        from main import _question_gains
+        scored = _question_gains(self.index, mask, self.columns, asked)
+        cost = 0.0   # nothing left to ask: the game ends here
+        if scored is not None:
+            keys, yes_counts, gains, total = scored
+            for i in np.argsort(-gains, kind="stable")[:self.beam]:
+                if gains[i] <= 0.0:
+                    break
+                c = self._split_cost(mask, keys[i], int(yes_counts[i]), total, depth - 1, asked, deadline)
+                cost = c if cost == 0.0 else min(cost, c)
+        self._memo[memo_key] = cost
+        return cost
+
+
+_planners = weakref.WeakKeyDictionary()   # one planner (and memo) per shared CandidateIndex
+_planners_lock = threading.Lock()
+
+
+def get_planner(index, columns, depth=DEFAULT_DEPTH):
+    key = (tuple(columns), depth)
+    with _planners_lock:
+        planners = _planners.setdefault(index, {})
+        if key not in planners:
+            planners[key] = LookaheadPlanner(index, columns, depth)
+        return planners[key]
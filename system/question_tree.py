@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import weakref
+
+import numpy as np
+
+# ==============================
+# Precomputed first questions
+# ==============================
+# Every game starts from the same full candidate set, so the first few
+# questions only depend on the answers given so far.  The tree maps an answer
+# path ("" for the first question, then one letter per answer: y / n / i) to
+# the question the live selector would ask there, down to a fixed depth.  It
+# is stored as JSON next to the dataset and rebuilt whenever the hash of the
+# probe columns changes.
+
+TREE_VERSION = 3
+DEFAULT_DEPTH = 4
+ANSWER_CODES = {'yes': 'y', 'no': 'n', 'idk': 'i'}
+FILE_SUFFIX = ".qtree.json"
+
+
+def dataset_hash(index, columns):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([TREE_VERSION, index.n, list(columns)]).encode("utf-8"))
+    for col in columns:
+        if col in index.years:
+            h.update(np.ascontiguousarray(index.years[col]).tobytes())
+            h.update(np.ascontiguousarray(index.latest_years[col]).tobytes())
+            continue
+        h.update(np.ascontiguousarray(index.pair_rows[col]).tobytes())
+        h.update(np.ascontiguousarray(index.codes[col]).tobytes())
+        h.update(json.dumps([str(v) for v in index.values[col]], ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+class QuestionTree:
+    def __init__(self, digest, depth, nodes):
+        self.hash = digest
+        self.depth = depth
+        self.nodes = nodes   # path -> [col, val] or None when no question helps
+
+    def __contains__(self, path):
+        return path is not None and path in self.nodes
+
+    def question(self, path):
+        """[col, val] cached for an answer path, None if the selector had nothing left to ask."""
+        return self.nodes[path]
+
+    @classmethod
+    def build(cls, index, columns, depth=DEFAULT_DEPTH, digest=None):
+        from main import _best_question_codes
+        nodes = {}
+        frontier = [("", index.full_mask(), frozenset())]
+        while frontier:
+            path, mask, asked = frontier.pop()
+            best = _best_question_codes(index, mask, columns, asked)
+            if best is None:
+                nodes[path] = None
+                continue
+            col, val, gain = best
+            nodes[path] = [col, val]
+            if len(path) + 1 >= depth:
+                continue
+            key = (col, None if col == 'alive' else str(val))   # as AkinatorEngine.apply_answer records it
+            child_asked = asked | {key}
+            frontier.append((path + 'y', mask & index.answer_bits(col, val, True), child_asked))
+            frontier.append((path + 'n', mask & index.answer_bits(col, val, False), child_asked))
+            frontier.append((path + 'i', mask, child_asked))
+        return cls(digest or dataset_hash(index, columns), depth, nodes)
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"hash": self.hash, "depth": self.depth, "nodes": self.nodes}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data["hash"], data["depth"], data["nodes"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+_trees = {}
+_trees_by_index = weakref.WeakKeyDictionary()   # skips re-hashing for engines sharing an index
+_trees_lock = threading.Lock()
+
+
+def get_question_tree(df, index, columns, depth=DEFAULT_DEPTH):
+    """Tree for this dataset, loaded from disk or (re)built when the dataset hash changed."""
+    key = (tuple(columns), depth)
+    with _trees_lock:
+        tree = _trees_by_index.get(index, {}).get(key)
+    if tree is not None:
+        return tree
+    digest = dataset_hash(index, columns)
+    with _trees_lock:
+        tree = _trees.get(digest)
+        if tree is not None and tree.depth >= depth:
+            _trees_by_index.setdefault(index, {})[key] = tree
+            return tree
+        base = df.attrs.get("index_base", df.attrs.get("source"))
+        path = base + FILE_SUFFIX if base else None
+        tree = QuestionTree.load(path) if path else None
+        if tree is None or tree.hash != digest or tree.depth < depth:
+            tree = QuestionTree.build(index, columns, depth, digest)
+            if path:
+                try:
+                    tree.save(path)
+                except OSError:
+                    pass
+        _trees[digest] = tree
+        _trees_by_index.setdefault(index, {})[key] = tree
+        return tree
+
+
+if __name__ == "__main__":
+    # python question_tree.py path/to/arabic_personalities.csv [depth]
+    from main import load_csv, collapse_entities
+    from candidates import CandidateIndex, PROBE_COLUMNS
+    df = collapse_entities(load_csv(sys.argv[1]))
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_DEPTH
+    tree = get_question_tree(df, CandidateIndex(df), PROBE_COLUMNS, depth)
+    print(f"{len(tree.nodes)} cached questions, depth {tree.depth}, dataset {tree.hash}")
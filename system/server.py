@@ -0,0 +1,294 @@
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from main import (AkinatorEngine, BayesianAkinatorEngine, collapse_entities, display_value, load_csv, rank_rows,
+                  start_model_loading)
+from candidates import CandidateIndex
+from dataset_cache import row_with_text
+from instrumentation import Metrics, log_sink, prometheus_text
+import embedding_index
+
+# ==============================
+# Headless multi-session game server
+# ==============================
+# The dataset and its CandidateIndex (category codes, bitsets) are loaded once
+# and shared read-only by every game; the embedding matrix is shared through
+# embedding_index.  A session only owns its engine's candidate mask, asked set
+# and (copy-on-write) score vector.  Idle sessions are evicted.
+#
+#   POST   /sessions                  -> first question
+#   POST   /sessions/<id>/answer      {"answer": "yes"|"no"|"idk"} -> next question or final candidates
+#   POST   /sessions/<id>/hint        {"hint": "...", "exclude": [names]} -> best match
+#   GET    /sessions/<id>             -> state and current best guess
+#   DELETE /sessions/<id>
+#   GET    /metrics                   -> Prometheus text (when started with --metrics)
+
+DEFAULT_PORT = 8765
+IDLE_TIMEOUT = 600        # seconds without a request before a session is evicted
+SWEEP_INTERVAL = 30
+FINAL_CANDIDATES = 3      # same cut-off as the GUI's hint stage
+
+
+def person_json(row):
+    return {
+        "name": row['name'],
+        "gender": row['gender'],
+        "country": display_value(row['country']),
+        "occupation": display_value(row['occupation']),
+        "birth_date": display_value(row['birth_date']),
+        "death_date": display_value(row['death_date']),
+        "alive": bool(row['alive']),
+        "image_url": row['image_url'],
+        "description": row['description'],
+    }
+
+
+class Session:
+    def __init__(self, df, index, metrics=None, bayesian=False, lookahead=0):
+        self.id = uuid.uuid4().hex
+        if bayesian:
+            self.engine = BayesianAkinatorEngine(df, index=index, metrics=metrics)
+        else:
+            self.engine = AkinatorEngine(df, index=index, metrics=metrics, lookahead=lookahead)
+        self.lock = threading.Lock()
+        self.last_question = None
+        self.final = False
+        self.last_access = time.monotonic()
+
+    def step(self):
+        """Next question, or the final candidate list once the game has narrowed down."""
+        remaining = self.engine.count()
+        nxt = None if remaining <= FINAL_CANDIDATES else self.engine.next_question()
+        if nxt is None:
+            self.final = True
+            self.last_question = None
+            top = self.engine.top_k(FINAL_CANDIDATES)
+            return {"done": True, "remaining": remaining,
+                    "candidates": [person_json(r) for _, r in top.iterrows()]}
+        col, val, q_text = nxt
+        self.last_question = (col, val)
+        return {"done": False, "remaining": remaining, "question": q_text}
+
+    def answer(self, ans):
+        if self.last_question is None:
+            raise ValueError("no question is pending")
+        col, val = self.last_question
+        self.engine.apply_answer(col, val, ans)
+        return self.step()
+
+    def hint(self, hint, exclude=()):
+        df = self.engine.df
+        rows = self.engine.rows()
+        if exclude:
+            rows = rows[~np.isin(df['name'].to_numpy()[rows], list(exclude))]
+        if len(rows) == 0:
+            return {"guess": None}
+        best = rows[int(rank_rows(df, rows, hint, self.engine.metrics).argmax())]
+        return {"guess": person_json(row_with_text(df, best))}
+
+
+class SessionStore:
+    def __init__(self, df, index=None, idle_timeout=IDLE_TIMEOUT, metrics=None, bayesian=False, lookahead=0):
+        self.df = df
+        self.index = index if index is not None else CandidateIndex(df)
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics   # shared by every session's engine
+        self.bayesian = bayesian
+        self.lookahead = lookahead   # the planner's memo is shared through the index
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def create(self):
+        session = Session(self.df, self.index, self.metrics, self.bayesian, self.lookahead)
+        with self.lock:
+            self.sessions[session.id] = session
+            open_sessions = len(self.sessions)
+        if self.metrics is not None:
+            self.metrics.incr("sessions_created")
+            self.metrics.gauge("open_sessions", open_sessions)
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+        return session
+
+    def delete(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            stale = [sid for sid, s in self.sessions.items() if s.last_access < cutoff]
+            for sid in stale:
+                del self.sessions[sid]
+            open_sessions = len(self.sessions)
+        if self.metrics is not None and stale:
+            self.metrics.incr("sessions_evicted", len(stale))
+            self.metrics.gauge("open_sessions", open_sessions)
+        return len(stale)
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL):
+        def sweep():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        threading.Thread(target=sweep, name="session-sweeper", daemon=True).start()
+
+
+_SESSION_PATH = re.compile(r"^/sessions/([0-9a-f]+)(?:/(answer|hint))?$")
+
+
+class GameHandler(BaseHTTPRequestHandler):
+    store = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without this, keep-alive
+    # clients stall on Nagle + delayed ACK (~40 ms per request)
+    disable_nagle_algorithm = True
+
+    def _send(self, status, payload, content_type="application/json; charset=utf-8"):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _session(self):
+        m = _SESSION_PATH.match(self.path)
+        if not m:
+            return None, None
+        return self.store.get(m.group(1)), m.group(2)
+
+    def do_POST(self):
+        try:
+            body = self._body()
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON"})
+        if not isinstance(body, dict):
+            return self._send(400, {"error": "the request body must be a JSON object"})
+        if self.path == "/sessions":
+            session = self.store.create()
+            with session.lock:
+                return self._send(201, dict(session.step(), session=session.id))
+
+        session, action = self._session()
+        if session is None:
+            return self._send(404, {"error": "unknown session"})
+        with session.lock:
+            if action == "answer":
+                ans = str(body.get("answer", "")).lower()
+                if ans not in ("yes", "no", "idk"):
+                    return self._send(400, {"error": "answer must be yes, no or idk"})
+                try:
+                    return self._send(200, session.answer(ans))
+                except ValueError as e:
+                    return self._send(409, {"error": str(e)})
+            if action == "hint":
+                hint = str(body.get("hint", "")).strip()
+                if not hint:
+                    return self._send(400, {"error": "hint is required"})
+                exclude = body.get("exclude") or []
+                if not isinstance(exclude, list) or not all(isinstance(n, str) for n in exclude):
+                    return self._send(400, {"error": "exclude must be a list of names"})
+                try:
+                    return self._send(200, session.hint(hint, exclude))
+                except Exception as e:
+                    # the model failed to load or encode; the game itself can go on
+                    if self.store.metrics is not None:
+                        self.store.metrics.incr("hint_errors")
+                    return self._send(503, {"error": f"hints are unavailable: {e}"})
+        return self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        if self.path == "/metrics" and self.store.metrics is not None:
+            return self._send(200, prometheus_text(self.store.metrics), "text/plain; version=0.0.4")
+        session, action = self._session()
+        if session is None or action:
+            return self._send(404, {"error": "unknown session"})
+        with session.lock:
+            best = session.engine.best_guess()
+            return self._send(200, {
+                "session": session.id,
+                "remaining": session.engine.count(),
+                "done": session.final,
+                "best_guess": None if best is None else person_json(session.engine.person(best)),
+            })
+
+    def do_DELETE(self):
+        m = _SESSION_PATH.match(self.path)
+        if m and not m.group(2) and self.store.delete(m.group(1)):
+            return self._send(200, {"deleted": m.group(1)})
+        return self._send(404, {"error": "unknown session"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GameServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # the default of 5 drops SYNs when many clients connect at once
+
+
+def make_server(store, host="127.0.0.1", port=DEFAULT_PORT):
+    handler = type("BoundGameHandler", (GameHandler,), {"store": store})
+    return GameServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Akinator games over HTTP/JSON.")
+    parser.add_argument("csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--embedding-storage", choices=sorted(embedding_index.STORAGE_DTYPES),
+                        default=embedding_index.EMBEDDING_STORAGE)
+    parser.add_argument("--bayesian", action="store_true", help="soft answers: one wrong answer does not drop the target")
+    parser.add_argument("--lookahead", type=int, default=0, help="plan this many questions ahead (2 or 3)")
+    parser.add_argument("--metrics", action="store_true", help="time engine stages and serve GET /metrics")
+    parser.add_argument("--metrics-log", action="store_true", help="also log every metrics event")
+    args = parser.parse_args(argv)
+    embedding_index.EMBEDDING_STORAGE = args.embedding_storage
+
+    metrics = None
+    if args.metrics or args.metrics_log:
+        if args.metrics_log:
+            logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+        metrics = Metrics([log_sink(level=logging.INFO)] if args.metrics_log else [])
+    start_model_loading()
+    df = collapse_entities(load_csv(args.csv))
+    store = SessionStore(df, idle_timeout=args.idle_timeout, metrics=metrics, bayesian=args.bayesian,
+                         lookahead=args.lookahead)
+    store.start_sweeper()
+    server = make_server(store, args.host, args.port)
+    print(f"Serving {len(df)} candidates on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the modules live flat in data/ and system/ and import each other by name
+sys.path[:0] = [os.path.join(ROOT, "data"), os.path.join(ROOT, "system")]
+# Qt needs no display for QImage / QPixmap
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
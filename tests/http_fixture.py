@@ -0,0 +1,55 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==============================
+# Local HTTP stand-in for Wikidata, Wikipedia and image hosts
+# ==============================
+# FixtureServer answers every GET with respond(path, query) -> (status,
+# headers, body) on a free local port and records the requests it served, so
+# the crawler and the image loader can be driven without the network.  A body
+# that is not bytes is sent as JSON.
+
+
+class FixtureServer:
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []    # (path, query) in arrival order
+        self.lock = threading.Lock()
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+                path = urllib.parse.unquote(url.path)
+                with fixture.lock:
+                    fixture.requests.append((path, query))
+                status, headers, body = fixture.respond(path, query)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def paths(self, prefix=""):
+        with self.lock:
+            return [p for p, _ in self.requests if p.startswith(prefix)]
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
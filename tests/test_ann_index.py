@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex, exact_search, recall_at_k
+
+ROWS = 4000
+DIM = 32
+CLUSTERS = 40
+
+
+def _unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def data():
+    # clustered unit vectors, queried with perturbed copies of some rows (as the hint stage does)
+    rng = np.random.default_rng(0)
+    centers = _unit(rng.normal(size=(CLUSTERS, DIM)))
+    matrix = _unit(centers[rng.integers(CLUSTERS, size=ROWS)] + rng.normal(0, 0.2, (ROWS, DIM)))
+    queries = _unit(matrix[rng.choice(ROWS, 100, replace=False)] + rng.normal(0, 0.05, (100, DIM)))
+    return matrix, queries, IVFIndex.build(matrix)
+
+
+def test_recall_at_k_over_all_rows(data):
+    matrix, queries, ivf = data
+    assert recall_at_k(ivf, matrix, queries, k=10) >= 0.95
+    # probing every list is the exact scan
+    assert recall_at_k(ivf, matrix, queries, k=10, nprobe=len(ivf.centroids)) == 1.0
+
+
+# the hint stage only uses the IVF index for large candidate sets (ANN_THRESHOLD); very
+# sparse masks stop widening the probe at the first k allowed rows, so recall drops
+@pytest.mark.parametrize("fraction, min_recall", [(0.5, 0.9), (0.02, 0.6)])
+def test_recall_at_k_with_a_candidate_mask(data, fraction, min_recall):
+    matrix, queries, ivf = data
+    allowed = np.random.default_rng(1).random(ROWS) < fraction
+    assert recall_at_k(ivf, matrix, queries, k=10, allowed=allowed) >= min_recall
+    for q in queries[:10]:
+        rows, _ = ivf.search(q, matrix, k=10, allowed=allowed)
+        # sparse masks widen the probe until k allowed rows are found
+        assert len(rows) == 10 and allowed[rows].all()
+        assert len(exact_search(q, matrix, 10, allowed)[0]) == 10
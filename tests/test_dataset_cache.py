@@ -0,0 +1,42 @@
+import os
+import time
+
+from dataset_cache import row_with_text, text_column
+from main import load_csv
+
+HEADER = "name,gender,country,occupation,birth_date,death_date,image_url,description\n"
+
+
+def _write(path, names):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for name in names:
+            f.write(f"{name},male,Egypt,poet,1900,,http://img/{name},About {name}\n")
+    # a distinct mtime even on coarse-grained filesystems
+    stamp = time.time_ns() + len(names)
+    os.utime(path, ns=(stamp, stamp))
+
+
+def test_text_is_read_back_for_every_row(tmp_path):
+    path = str(tmp_path / "people.csv")
+    _write(path, ["A", "B", "C"])
+    df = load_csv(path)
+    assert "description" not in df.columns
+    assert list(text_column(df, "description")) == ["About A", "About B", "About C"]
+    assert list(text_column(df, "image_url", [2, 0])) == ["http://img/C", "http://img/A"]
+    assert row_with_text(df, 1)["description"] == "About B"
+
+
+def test_frames_keep_their_own_text_after_the_cache_is_rebuilt(tmp_path):
+    path = str(tmp_path / "people.csv")
+    names = [f"P{i}" for i in range(6)]
+    _write(path, names)
+    old = load_csv(path)
+    _write(path, names[::-1])
+    new = load_csv(path)
+    assert list(new["name"]) == names[::-1]
+    # the first frame's refs still resolve against the store it was loaded with
+    assert row_with_text(old, 5)["description"] == "About P5"
+    assert list(text_column(old, "description")) == [f"About {n}" for n in names]
+    assert row_with_text(new, 5)["description"] == "About P0"
+    assert not [f for f in os.listdir(path + ".cache") if ".tmp" in f]
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex
+
+
+class CountingModel:
+    def __init__(self, dim):
+        self.dim = dim
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        vecs = np.array([[len(t) + 1.0] + [1.0] * (self.dim - 1) for t in texts], dtype=np.float32)
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_ensure_only_reads_the_text_of_rows_not_yet_checked():
+    texts = [f"description {i}" for i in range(10)]
+    requested = []
+
+    def lazy(positions):
+        requested.append(list(positions))
+        return [texts[r] for r in rows[positions]]
+
+    index = EmbeddingIndex(None, len(texts), dim=4)
+    model = CountingModel(4)
+    rows = np.array([1, 3, 5])
+    assert index.ensure(rows, lazy, model) == 3
+    rows = np.array([1, 2, 3, 4, 5])
+    assert index.ensure(rows, lazy, model) == 2
+    assert requested == [[0, 1, 2], [1, 3]]
+    assert model.encoded == [texts[1], texts[3], texts[5], texts[2], texts[4]]
+    # everything checked: the callable is not called at all
+    assert index.ensure(rows, lazy, model) == 0
+    assert len(requested) == 2
+    # a plain list of texts still works
+    assert index.ensure(np.array([0, 9]), [texts[0], texts[9]], model) == 2
+
+
+def test_sharded_build_refuses_an_index_opened_copy_on_write(tmp_path, monkeypatch):
+    import embedding_builder
+
+    base = str(tmp_path / "people")
+    EmbeddingIndex(base, 3, dim=4).flush()
+    index = EmbeddingIndex(base, 3, dim=4)
+    # root ignores file modes, so mark it read-only the way _open does for unwritable files
+    index.read_only = True
+    monkeypatch.setattr(embedding_builder, "get_embedding_index", lambda df, storage: index)
+    monkeypatch.setattr(embedding_builder, "text_column", lambda df, col: pytest.fail("read the texts"))
+    with pytest.raises(PermissionError):
+        embedding_builder.build_sharded(object())
+    assert not os.path.exists(embedding_builder.shard_dir(index))
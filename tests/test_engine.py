@@ -0,0 +1,220 @@
+import os
+import shutil
+import threading
+from datetime import date
+from math import log2
+
+import numpy as np
+import pytest
+
+from benchmark import oracle_answer
+from candidates import RANGE_BITS_CACHE, RANGE_COLUMNS, CandidateIndex, parse_years
+from main import AkinatorEngine, _key_question, _question_gains, collapse_entities, load_csv
+from question_tree import FILE_SUFFIX, QuestionTree
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data",
+                       "arabic_personalities.csv")
+GAMES = 60
+MAX_QUESTIONS = 60
+
+
+@pytest.fixture(scope="module")
+def entities(tmp_path_factory):
+    # a copy, so the cache and question tree files land in a temp dir
+    path = str(tmp_path_factory.mktemp("dataset") / "arabic_personalities.csv")
+    shutil.copy(DATASET, path)
+    return collapse_entities(load_csv(path))
+
+
+@pytest.fixture(scope="module")
+def index(entities):
+    return CandidateIndex(entities)
+
+
+def _targets(entities, n=GAMES, seed=0):
+    # every merged name whose years sit on both sides of some threshold, then random rows
+    multi = [i for i, years in enumerate(entities['birth_date']) if len(years) > 1]
+    rng = np.random.default_rng(seed)
+    return multi[:n // 2] + list(rng.choice(len(entities), n - n // 2, replace=False))
+
+
+def _cells(value):
+    return value if isinstance(value, tuple) else (value,)
+
+
+@pytest.fixture(scope="module")
+def year_spans(entities):
+    """Per year column, each row's (earliest, latest) plausible year, NaN when it has none."""
+    spans = {}
+    for col in RANGE_COLUMNS:
+        earliest, latest = [], []
+        for cell in entities[col]:
+            years = [y for y in parse_years(list(_cells(cell))) if y <= date.today().year]
+            earliest.append(min(years) if years else np.nan)
+            latest.append(max(years) if years else np.nan)
+        spans[col] = np.array(earliest), np.array(latest)
+    return spans
+
+
+def _reference_gains(possible, rows, year_spans, asked):
+    """{(col, val): gain} of every askable question, counted directly off the candidate frame."""
+    total = len(possible)
+    gains = {}
+
+    def add(key, yes, no):
+        if 0 < yes < total and 0 < no < total:
+            gains[key] = log2(total) - (yes * log2(yes) + no * log2(no)) / (yes + no)
+
+    for col in ['gender', 'country', 'occupation']:
+        cells = [_cells(v) for v in possible[col]]
+        for val in dict.fromkeys(v for cell in cells for v in cell):
+            if str(val).strip() and (col, str(val)) not in asked:
+                yes = sum(val in cell for cell in cells)
+                add((col, val), yes, total - yes)
+    if ('alive', None) not in asked:
+        yes = int((possible['alive'] == True).sum())  # noqa: E712
+        add(('alive', None), yes, total - yes)
+    for col in RANGE_COLUMNS:
+        earliest, latest = year_spans[col]
+        # a threshold at every known earliest year but the first
+        thresholds = np.unique(earliest[~np.isnan(earliest)])[1:].astype(int)
+        with np.errstate(invalid='ignore'):
+            yes = (earliest[rows, None] < thresholds).sum(axis=0)
+            no = total - (latest[rows, None] < thresholds).sum(axis=0)
+        for t, y, n in zip(thresholds, yes, no):
+            if (col, str(t)) not in asked:
+                add((col, int(t)), int(y), int(n))
+    return gains
+
+
+def test_selector_scores_every_question_like_a_direct_count(entities, index, year_spans):
+    for target in _targets(entities, n=20, seed=1):
+        row = entities.iloc[target]
+        engine = AkinatorEngine(entities, index=index, tree=False)
+        for step in range(MAX_QUESTIONS):
+            rows = engine.rows()
+            expected = _reference_gains(entities.iloc[rows], rows, year_spans, engine.asked)
+            scored = _question_gains(index, engine.mask, engine.columns_to_probe, engine.asked)
+            gains = {} if scored is None else {_key_question(index, k): g for k, g in zip(scored[0], scored[2])}
+            assert gains.keys() == expected.keys(), row['name']
+            for key, gain in gains.items():
+                assert gain == pytest.approx(expected[key]), (row['name'], key)
+            q = engine.next_question()
+            if q is None:
+                assert not expected
+                break
+            col, val, _ = q
+            assert expected[(col, val)] == pytest.approx(max(expected.values()))
+            # every fourth answer is "don't know": asked, but no candidate is dropped
+            engine.apply_answer(col, val, 'idk' if step % 4 == 3 else oracle_answer(row, col, val))
+        else:
+            pytest.fail(f"{row['name']}: still asking after {MAX_QUESTIONS} questions")
+
+
+@pytest.fixture(scope="module")
+def tree(entities, index):
+    columns = AkinatorEngine(entities, index=index, tree=False).columns_to_probe
+    path = entities.attrs["index_base"] + FILE_SUFFIX
+    QuestionTree.build(index, columns).save(path)
+    # read back, as a later process would load it
+    return QuestionTree.load(path)
+
+
+def test_every_tree_node_holds_the_live_selector_question(entities, index, tree):
+    visited = []
+
+    def walk(path, answers):
+        live = AkinatorEngine(entities, index=index, tree=False)
+        for col, val, ans in answers:
+            live.apply_answer(col, val, ans)
+        q = live.next_question()
+        assert tree.question(path) == (list(q[:2]) if q else None), path
+        visited.append(path)
+        if q and len(path) + 1 < tree.depth:
+            for ans, code in [('yes', 'y'), ('no', 'n'), ('idk', 'i')]:
+                walk(path + code, answers + [(q[0], q[1], ans)])
+
+    walk("", [])
+    assert sorted(visited) == sorted(tree.nodes)
+
+
+def test_games_ask_the_same_questions_with_and_without_the_tree(entities, index, tree):
+    for step, target in enumerate(_targets(entities, n=30, seed=2)):
+        row = entities.iloc[target]
+        cached = AkinatorEngine(entities, index=index, tree=tree)
+        live = AkinatorEngine(entities, index=index, tree=False)
+        for i in range(tree.depth + 2):
+            q = cached.next_question()
+            assert q == live.next_question(), (row['name'], cached.path)
+            if q is None:
+                break
+            col, val, _ = q
+            ans = 'idk' if (step + i) % 5 == 4 else oracle_answer(row, col, val)
+            cached.apply_answer(col, val, ans)
+            live.apply_answer(col, val, ans)
+        assert (cached.mask == live.mask).all()
+
+
+@pytest.mark.parametrize("lookahead", [0, 2])
+def test_every_answer_shrinks_the_candidates_and_keeps_the_target(entities, index, lookahead):
+    for target in _targets(entities):
+        row = entities.iloc[target]
+        engine = AkinatorEngine(entities, index=index, tree=False, lookahead=lookahead)
+        for _ in range(MAX_QUESTIONS):
+            q = engine.next_question()
+            if q is None:
+                break
+            col, val, _ = q
+            before = engine.count()
+            engine.apply_answer(col, val, oracle_answer(row, col, val))
+            assert engine.count() < before, (row['name'], col, val)
+            assert target in engine.rows()
+        else:
+            pytest.fail(f"{row['name']}: still asking after {MAX_QUESTIONS} questions")
+
+
+def test_collapse_groups_by_wikidata_id_and_falls_back_to_the_name(tmp_path):
+    path = tmp_path / "people.csv"
+    rows = [
+        ("Q1", "Ali Hassan", "male", "Egypt", "actor", "1950", ""),
+        ("Q1", "Ali Hassan", "male", "Egypt", "singer", "1950", ""),
+        ("Q2", "Ali Hassan", "female", "Iraq", "poet", "1980", "2020"),
+        ("", "Old Row", "male", "Syria", "jurist", "1900", "1970"),
+        ("", "Old Row", "male", "Syria", "diplomat", "1900", "1970"),
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("wikidata_id,name,gender,country,occupation,birth_date,death_date,image_url,description\n")
+        for row in rows:
+            f.write(",".join(row) + ",,about\n")
+    out = collapse_entities(load_csv(str(path)))
+    assert list(out['name']) == ["Ali Hassan", "Ali Hassan", "Old Row"]
+    assert list(out['gender']) == ["male", "female", "male"]
+    assert list(out['alive']) == [True, False, False]
+    assert out['occupation'].tolist() == [("actor", "singer"), ("poet",), ("jurist", "diplomat")]
+
+
+def test_range_bitsets_are_shared_safely_between_threads(entities):
+    # a fresh index: more thresholds than the LRU holds, so threads evict concurrently
+    index = CandidateIndex(entities)
+    thresholds = [int(t) for t in index.thresholds['birth_date']]
+    assert 2 * len(thresholds) > RANGE_BITS_CACHE
+    errors = []
+
+    def work(offset):
+        try:
+            for _ in range(10):
+                for t in thresholds[offset::4]:
+                    for yes in (True, False):
+                        index.answer_bits('birth_date', t, yes)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i % 4,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(index._range_bits) == RANGE_BITS_CACHE
+    expected = (index.years['birth_date'] < thresholds[0]) & ~np.isnan(index.years['birth_date'])
+    assert (index.flags(index.answer_bits('birth_date', thresholds[0], True)) == expected).all()
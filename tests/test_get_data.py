@@ -0,0 +1,219 @@
+import csv
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import get_data
+from http_fixture import FixtureServer
+
+
+# ==============================
+# Wikipedia summaries
+# ==============================
+@pytest.fixture
+def wikipedia(monkeypatch):
+    state = {"active": 0, "peak": 0, "throttled": set()}
+    lock = threading.Lock()
+
+    def respond(path, query):
+        name = path[len("/wiki/"):]
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.02)
+        with lock:
+            state["active"] -= 1
+            # the first request for a "Slow_*" page is rate limited
+            if name.startswith("Slow_") and name not in state["throttled"]:
+                state["throttled"].add(name)
+                return 429, {"Retry-After": "0.1"}, b""
+        if name.startswith("Missing_"):
+            return 404, {}, b""
+        return 200, {"Content-Type": "application/json"}, {"extract": f"About {name}"}
+
+    with FixtureServer(respond) as fixture:
+        fixture.state = state
+        monkeypatch.setattr(get_data, "WIKIPEDIA_SUMMARY_URL", fixture.url + "/wiki/{}")
+        yield fixture
+
+
+def test_fetch_descriptions_fetches_each_name_once_concurrently(wikipedia):
+    names = [f"Person {i}" for i in range(16)]
+    descriptions = get_data.fetch_descriptions(names + names[:5] + ["", "Missing One"],
+                                               limiter=get_data.RateLimiter(per_second=0))
+    assert descriptions["Person 3"] == "About Person_3"
+    assert descriptions["Missing One"] == ""
+    assert "" not in descriptions
+    assert sorted(wikipedia.paths("/wiki/")) == sorted({f"/wiki/{n.replace(' ', '_')}" for n in names + ["Missing One"]})
+    assert wikipedia.state["peak"] > 1
+
+
+def test_fetch_descriptions_skips_names_already_cached(wikipedia):
+    cache = {"Known": "cached text"}
+    descriptions = get_data.fetch_descriptions(["Known", "New"], limiter=get_data.RateLimiter(per_second=0),
+                                               cache=cache)
+    assert descriptions == {"Known": "cached text", "New": "About New"}
+    assert wikipedia.paths("/wiki/") == ["/wiki/New"]
+    assert cache["New"] == "About New"
+
+
+def test_rate_limited_summary_is_retried_after_backoff(wikipedia):
+    limiter = get_data.RateLimiter(per_second=0)
+    t0 = time.monotonic()
+    assert get_data.get_wikipedia_description("Slow Page", get_data.make_session(1), limiter) == "About Slow_Page"
+    # the 429's Retry-After pushed the limiter's next slot out before the retry
+    assert time.monotonic() - t0 >= 0.1
+    assert wikipedia.paths("/wiki/") == ["/wiki/Slow_Page", "/wiki/Slow_Page"]
+
+
+# ==============================
+# Wikidata crawl: keyset pages, checkpoint, compaction
+# ==============================
+COUNTRIES = ["Q79", "Q851", "Q916"]
+PEOPLE_PER_COUNTRY = 9
+_QUERY_COUNTRY = re.compile(r"VALUES \?country \{ wd:(Q\d+) \}")
+_QUERY_AFTER = re.compile(r'STR\(\?person\) > "([^"]*)"')
+_QUERY_LIMIT = re.compile(r"LIMIT (\d+)")
+
+
+def _bindings(country):
+    """1-3 occupation rows per person; every third person has two images, which repeats each of its rows."""
+    rows = []
+    for p in range(PEOPLE_PER_COUNTRY):
+        iri = f"http://www.wikidata.org/entity/Q{country[1:]}{p:03d}"
+        for occupation in range(1 + p % 3):
+            for image in range(2 if p % 3 == 0 else 1):
+                rows.append({
+                    "person": {"value": iri}, "personLabel": {"value": f"Person {country}-{p}"},
+                    "genderLabel": {"value": "female"}, "countryLabel": {"value": f"Country {country}"},
+                    "occupationLabel": {"value": f"occupation {occupation}"},
+                    "birthDate": {"value": "1950-01-01T00:00:00Z"}, "image": {"value": f"http://img/{p}-{image}"},
+                })
+    return sorted(rows, key=lambda r: r["person"]["value"])
+
+
+@pytest.fixture
+def wikidata(monkeypatch):
+    data = {c: _bindings(c) for c in COUNTRIES}
+    throttled = []
+
+    def respond(path, query):
+        if path.startswith("/wiki/"):
+            return 200, {}, {"extract": "About " + path[len("/wiki/"):]}
+        sparql = query["query"]
+        country = _QUERY_COUNTRY.search(sparql).group(1)
+        after = _QUERY_AFTER.search(sparql)
+        after = after.group(1) if after else ""
+        # the first request ever is rate limited
+        if not throttled:
+            throttled.append(country)
+            return 429, {"Retry-After": "0.1"}, b""
+        rows = [r for r in data[country] if r["person"]["value"] > after]
+        return 200, {}, {"results": {"bindings": rows[:int(_QUERY_LIMIT.search(sparql).group(1))]}}
+
+    with FixtureServer(respond) as fixture:
+        fixture.data = data
+        monkeypatch.setattr(get_data, "SPARQL_URL", fixture.url + "/sparql")
+        monkeypatch.setattr(get_data, "WIKIPEDIA_SUMMARY_URL", fixture.url + "/wiki/{}")
+        monkeypatch.setattr(get_data, "LIMIT", 5)
+        monkeypatch.setattr(get_data, "SLEEP_BETWEEN_BATCHES", 0)
+        yield fixture
+
+
+def _crawl(monkeypatch, checkpoint, max_results=10 ** 9, workers=3):
+    """main() without its compaction: every partition crawled by a pool until done or max_results."""
+    monkeypatch.setattr(get_data, "MAX_RESULTS", max_results)
+    session, limiter, stop = get_data.make_session(4), get_data.RateLimiter(per_second=0), threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(get_data.crawl_partition, c, checkpoint, session, limiter, stop, {})
+                       for c in COUNTRIES]:
+            future.result()
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_split_page_never_cuts_a_person_across_pages(monkeypatch):
+    monkeypatch.setattr(get_data, "LIMIT", 4)
+    items = [{"person": {"value": iri}} for iri in ["a", "b", "b", "c"]]
+    assert get_data.split_page(items, None) == (items[:3], "b", False)
+    assert get_data.split_page(items[:3], "x") == (items[:3], "b", True)
+    assert get_data.split_page([], "x") == ([], "x", True)
+    # one person filling a whole page is taken as is
+    same = [{"person": {"value": "d"}}] * 4
+    assert get_data.split_page(same, "c") == (same, "d", False)
+
+
+def test_fetch_page_waits_out_a_429(wikidata):
+    limiter = get_data.RateLimiter(per_second=0)
+    t0 = time.monotonic()
+    items = get_data.fetch_page("Q79", None, get_data.make_session(1), limiter)
+    assert time.monotonic() - t0 >= 0.1
+    assert items == wikidata.data["Q79"][:5]
+    assert len(wikidata.paths("/sparql")) == 2
+
+
+def test_crawl_pages_by_keyset_and_compacts_without_duplicates(wikidata, monkeypatch, tmp_path):
+    checkpoint = get_data.Checkpoint(str(tmp_path / "checkpoint"))
+    _crawl(monkeypatch, checkpoint)
+    assert all(checkpoint.partition(c)["done"] for c in COUNTRIES)
+
+    # every page continued after the last person kept from the one before
+    afters = [_QUERY_AFTER.search(q["query"]) for p, q in wikidata.requests if p == "/sparql"]
+    afters = [m.group(1) for m in afters if m]
+    assert len(afters) == len(set(afters))
+
+    checkpoint.compact(str(tmp_path / "out.csv"), COUNTRIES)
+    rows = _read_csv(tmp_path / "out.csv")
+    expected = {(b["personLabel"]["value"], b["countryLabel"]["value"], b["occupationLabel"]["value"])
+                for c in COUNTRIES for b in wikidata.data[c]}
+    assert len(rows) == len(expected)
+    assert {(r["name"], r["country"], r["occupation"]) for r in rows} == expected
+    assert rows[0]["description"] == "About Person_Q79-0"
+    assert rows[0]["wikidata_id"] == "Q79000"
+    # descriptions were fetched once per person, not once per row
+    assert len(wikidata.paths("/wiki/")) == len(COUNTRIES) * PEOPLE_PER_COUNTRY
+
+
+def test_interrupted_crawl_resumes_from_the_committed_state(wikidata, monkeypatch, tmp_path):
+    directory = str(tmp_path / "checkpoint")
+    checkpoint = get_data.Checkpoint(directory)
+    _crawl(monkeypatch, checkpoint, max_results=8, workers=1)
+    partial = checkpoint.records()
+    assert 8 <= partial < sum(len(v) for v in wikidata.data.values())
+    # a page torn mid-write after its state was committed
+    with open(checkpoint.path("Q79"), "ab") as f:
+        f.write(b'{"name": "torn')
+
+    resumed = get_data.Checkpoint(directory)
+    assert resumed.records() == partial
+    assert os.path.getsize(resumed.path("Q79")) == resumed.partition("Q79")["bytes"]
+    _crawl(monkeypatch, resumed)
+
+    fresh = get_data.Checkpoint(str(tmp_path / "fresh"))
+    _crawl(monkeypatch, fresh)
+    resumed.compact(str(tmp_path / "resumed.csv"), COUNTRIES)
+    fresh.compact(str(tmp_path / "fresh.csv"), COUNTRIES)
+    assert _read_csv(tmp_path / "resumed.csv") == _read_csv(tmp_path / "fresh.csv")
+
+
+def test_compact_keeps_an_imported_csv_behind_crawled_names(wikidata, monkeypatch, tmp_path):
+    old_csv = tmp_path / "old.csv"
+    with open(old_csv, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=get_data.FIELDS)
+        writer.writeheader()
+        for name in ["Person Q79-0", "Old Person"]:
+            writer.writerow(dict.fromkeys(get_data.FIELDS, "") | {"name": name, "occupation": "poet"})
+    checkpoint = get_data.Checkpoint(str(tmp_path / "checkpoint"))
+    assert checkpoint.import_legacy(str(old_csv), str(tmp_path / "none.jsonl"), str(tmp_path / "none.json")) == 2
+    _crawl(monkeypatch, checkpoint)
+    checkpoint.compact(str(tmp_path / "out.csv"), COUNTRIES)
+    rows = _read_csv(tmp_path / "out.csv")
+    assert [r["occupation"] for r in rows if r["name"] == "Old Person"] == ["poet"]
+    assert "poet" not in [r["occupation"] for r in rows if r["name"] == "Person Q79-0"]
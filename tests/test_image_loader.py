@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+QtGui = pytest.importorskip("PyQt6.QtGui")
+from PyQt6.QtCore import QBuffer, QCoreApplication, QIODevice  # noqa: E402
+
+from http_fixture import FixtureServer  # noqa: E402
+
+SIZE = (40, 40)
+
+
+def _png(width=80, height=20):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format.Format_RGB32)
+    image.fill(0x336699)
+    buf = QBuffer()
+    buf.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buf, "PNG")
+    return bytes(buf.data())
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+
+@pytest.fixture
+def server():
+    png = _png()
+
+    def respond(path, query):
+        if path.startswith("/img/"):
+            return 200, {"Content-Type": "image/png"}, png
+        if path.startswith("/broken/"):
+            return 200, {"Content-Type": "image/png"}, b"not an image"
+        return 404, {}, b""
+
+    with FixtureServer(respond) as fixture:
+        yield fixture
+
+
+class Events:
+    def __init__(self, loader):
+        self.loaded, self.failed = {}, {}
+        loader.loaded.connect(lambda url, pix: self.loaded.__setitem__(url, pix))
+        loader.failed.connect(lambda url, error: self.failed.__setitem__(url, error))
+
+    def wait(self, *urls, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not all(u in self.loaded or u in self.failed for u in urls):
+            assert time.monotonic() < deadline, "image loader did not answer"
+            QCoreApplication.processEvents()
+            time.sleep(0.005)
+
+
+def test_loads_scaled_pixmap_and_caches_bytes_on_disk(app, server, tmp_path):
+    from image_loader import ImageLoader, _cache_path
+    loader = ImageLoader(SIZE, cache_dir=str(tmp_path))
+    events = Events(loader)
+    url = server.url + "/img/a.png"
+    assert loader.request(url) is None
+    events.wait(url)
+    pix = events.loaded[url]
+    # 80x20 kept its aspect ratio inside 40x40
+    assert (pix.width(), pix.height()) == (40, 10)
+    assert loader.request(url).cacheKey() == pix.cacheKey()
+    assert os.path.exists(_cache_path(str(tmp_path), url))
+
+    # a fresh loader (empty memory LRU) reads the disk cache instead of the network
+    again = ImageLoader(SIZE, cache_dir=str(tmp_path))
+    events = Events(again)
+    again.request(url)
+    events.wait(url)
+    assert url in events.loaded
+    assert server.paths("/img/") == ["/img/a.png"]
+
+
+def test_reports_missing_and_undecodable_images(app, server, tmp_path):
+    from image_loader import ImageLoader
+    loader = ImageLoader(SIZE, cache_dir=str(tmp_path))
+    events = Events(loader)
+    missing, broken = server.url + "/gone.png", server.url + "/broken/b.png"
+    loader.request(missing)
+    loader.request(broken)
+    events.wait(missing, broken)
+    assert events.failed == {missing: "Image not found", broken: "Image load failed"}
+    assert loader.cached(missing) is None
+
+
+def test_prefetch_downloads_each_url_once_and_memory_is_bounded(app, server):
+    from image_loader import ImageLoader
+    loader = ImageLoader(SIZE, cache_dir=None, memory_items=2)
+    events = Events(loader)
+    urls = [server.url + f"/img/{i}.png" for i in range(3)]
+    loader.prefetch(urls + urls)
+    loader.request(urls[0])
+    events.wait(*urls)
+    assert sorted(server.paths("/img/")) == ["/img/0.png", "/img/1.png", "/img/2.png"]
+    assert sum(loader.cached(u) is not None for u in urls) == 2